@@ -1,20 +1,22 @@
 import tkinter as tk
 from tkinter import ttk, scrolledtext, filedialog, messagebox
-import requests
-from bs4 import BeautifulSoup
 import json
 from tkinter import messagebox
-import threading
+import multiprocessing
 import customtkinter as ctk
 import os
-from PIL import Image, ImageTk
 from config_manager import ConfigManager
-from ai_providers import OllamaProvider, OpenAIProvider, GeminiProvider, WebOnlyProvider
+from ai_providers import ProviderError, ProviderPool, provider_class
 from file_handlers import FileHandler
-from web_search import search_web
+from chunking import chunk_segments
+from file_index import FileIndex
+from conversation import Conversation
+from request_dispatcher import RequestDispatcher, RequestHandle
+from ui_dispatcher import UIDispatcher
 from user_preferences import UserPreferences
-from service_integrations import ServiceIntegrationManager
+from service_integrations import LocalServiceBackend, ServiceIntegrationManager, ServiceLayer
 import time
+from concurrent.futures import CancelledError
 from datetime import datetime
 
 # Custom color scheme
@@ -27,6 +29,13 @@ THEME = {
     'text_secondary': '#B0BEC5' # Secondary text color
 }
 
+# Dispatcher key for the main chat, so its turns are processed in order
+CHAT_CONVERSATION = "chat"
+
+STOPPED_MESSAGE = "⏹ Stopped."
+# Dispatcher key for work that has to wait until the selected provider is set up
+PROVIDER_SETUP = "provider"
+
 # Set appearance mode and default color theme
 ctk.set_appearance_mode("dark")
 ctk.set_default_color_theme("blue")
@@ -62,16 +71,54 @@ class LoadingDots(ctk.CTkFrame):
             dot.grid(row=0, column=i, padx=2)
             self.dots.append(dot)
         self.current_dot = 0
-        self.animate()
 
     def animate(self):
+        """Advances the animation by one step; driven by an AnimationTicker"""
         for i, dot in enumerate(self.dots):
             if i == self.current_dot:
                 dot.configure(text_color=THEME['primary'])
             else:
                 dot.configure(text_color=THEME['text_secondary'])
         self.current_dot = (self.current_dot + 1) % 3
-        self.after(500, self.animate)
+
+class AnimationTicker:
+    """
+    One timer that animates every loading indicator currently on screen.
+    Indicators are added while shown and removed when their request finishes
+    or they are recycled, and the timer stops while there is nothing to animate.
+    """
+    def __init__(self, widget, interval=500):
+        self.widget = widget
+        self.interval = interval
+        self._active = set()
+        self._after_id = None
+
+    def add(self, indicator):
+        self._active.add(indicator)
+        indicator.animate()
+        if self._after_id is None:
+            self._after_id = self.widget.after(self.interval, self._tick)
+
+    def discard(self, indicator):
+        self._active.discard(indicator)
+        if not self._active:
+            self.stop()
+
+    def stop(self):
+        if self._after_id is not None:
+            self.widget.after_cancel(self._after_id)
+            self._after_id = None
+
+    def _tick(self):
+        self._after_id = None
+        for indicator in list(self._active):
+            try:
+                indicator.animate()
+            except tk.TclError:
+                # The indicator's window was closed
+                self._active.discard(indicator)
+        if self._active:
+            self._after_id = self.widget.after(self.interval, self._tick)
 
 class ChatBubbleFrame(ctk.CTkFrame):
     def __init__(self, master, message, is_user=True, **kwargs):
@@ -80,73 +127,248 @@ class ChatBubbleFrame(ctk.CTkFrame):
         # Configure grid
         self.grid_columnconfigure(0, weight=1)
         
-        # Create bubble frame
-        bubble_color = THEME['primary'] if is_user else THEME['surface']
-        text_color = THEME['text']
-        
-        bubble = ctk.CTkFrame(
+        self.bubble = ctk.CTkFrame(
             self,
-            fg_color=bubble_color,
             corner_radius=20
         )
         
-        # Position bubble based on sender
-        if is_user:
-            bubble.grid(row=0, column=0, padx=(100, 20), pady=5, sticky="e")
-        else:
-            bubble.grid(row=0, column=0, padx=(20, 100), pady=5, sticky="w")
-        
         # Add message text
-        label = ctk.CTkLabel(
-            bubble,
-            text=message,
-            text_color=text_color,
+        self.label = ctk.CTkLabel(
+            self.bubble,
+            text_color=THEME['text'],
             font=("Helvetica", 12),
-            wraplength=400,
-            justify="left" if not is_user else "right"
+            wraplength=400
         )
-        label.pack(padx=15, pady=10)
+        self.label.pack(padx=15, pady=10)
+        self.set_message(message, is_user)
+
+    def set_message(self, message, is_user):
+        """Shows a different message in this bubble, so the widget can be reused"""
+        self.message = message
+        self.bubble.configure(fg_color=THEME['primary'] if is_user else THEME['surface'])
+        
+        # Position bubble based on sender
+        if is_user:
+            self.bubble.grid(row=0, column=0, padx=(100, 20), pady=5, sticky="e")
+        else:
+            self.bubble.grid(row=0, column=0, padx=(20, 100), pady=5, sticky="w")
+        self.label.configure(text=message, justify="left" if not is_user else "right")
+
+    def set_text(self, message):
+        self.message = message
+        self.label.configure(text=message)
+
+    def append_text(self, text):
+        self.set_text(self.message + text)
+
+class ChatEntry:
+    """One item of the chat history. Its widget exists only while it is inside the rendered window."""
+    def __init__(self, view, index, message, is_user, loading=False):
+        self.view = view
+        self.index = index
+        self.message = message
+        self.is_user = is_user
+        self.loading = loading
+
+    def set_text(self, message):
+        self.message = message
+        widget = self.view._widgets.get(self)
+        if widget is not None and not self.loading:
+            widget.set_text(message)
+
+    def append_text(self, text):
+        self.set_text(self.message + text)
 
 class ScrollableChatFrame(ctk.CTkScrollableFrame):
-    def __init__(self, master, **kwargs):
+    """
+    Chat view that keeps the whole history in a list of ChatEntry objects but only
+    realizes widgets for a window of window_size entries. Scrolling to either edge
+    slides the window, and widgets leaving it are recycled for the entries coming in.
+    Scrolling to the bottom is requested through the UI dispatcher, once per frame,
+    and loading indicators only animate while they are realized.
+    """
+    def __init__(self, master, ui, ticker, window_size=40, **kwargs):
         super().__init__(master, **kwargs)
         self.grid_columnconfigure(0, weight=1)
+        self.ui = ui
+        self.ticker = ticker
+        # Called when the user scrolls to the end of the history, e.g. to load more items
+        self.on_end = None
+        self.window_size = window_size
+        self.entries = []
+        self._start = 0
+        self._widgets = {}
+        self._bubble_pool = []
+        self._loading_pool = []
+        self._edge_check = None
+        # Watch the scroll position to slide the window when an edge is reached
+        self._parent_canvas.configure(yscrollcommand=self._on_canvas_scroll)
+
+    def add_message(self, message, is_user=True, scroll=True):
+        return self._append(ChatEntry(self, len(self.entries), message, is_user), scroll)
+
+    def add_loading_indicator(self):
+        return self._append(ChatEntry(self, len(self.entries), "", False, loading=True))
 
-    def add_message(self, message, is_user=True):
-        ChatBubbleFrame(self, message, is_user).grid(row=len(self.grid_slaves()), column=0, sticky="ew")
+    def replace_with_message(self, placeholder, message, is_user=False):
+        # Responses can finish out of order, so each one takes its placeholder's place
+        following = self.is_at_bottom()
+        placeholder.message = message
+        placeholder.is_user = is_user
+        if placeholder.loading:
+            placeholder.loading = False
+            if placeholder in self._widgets:
+                self._release(placeholder)
+                self._realize(placeholder)
+        else:
+            placeholder.set_text(message)
+        if following:
+            self.request_scroll()
+        return placeholder
+
+    def append_to_message(self, bubble, text):
+        # Streaming only keeps the view at the bottom if the user has not scrolled up to read
+        following = self.is_at_bottom()
+        bubble.append_text(text)
+        if following:
+            self.request_scroll()
+
+    def _append(self, entry, scroll=True):
+        following = self._start + self.window_size >= len(self.entries)
+        self.entries.append(entry)
+        if following:
+            self._realize(entry)
+            if len(self._widgets) > self.window_size:
+                self._release(self.entries[self._start])
+                self._start += 1
+        else:
+            self._render_window(max(0, len(self.entries) - self.window_size))
         
         # Scroll to bottom after adding message
-        self.after(100, self._scroll_to_bottom)
+        if scroll:
+            self.request_scroll()
+        return entry
+
+    def _render_window(self, start):
+        end = min(len(self.entries), start + self.window_size)
+        visible = set(self.entries[start:end])
+        for entry in list(self._widgets):
+            if entry not in visible:
+                self._release(entry)
+        for entry in self.entries[start:end]:
+            if entry not in self._widgets:
+                self._realize(entry)
+        self._start = start
+
+    def _realize(self, entry):
+        # Rows are absolute history positions; rows without a widget take no space
+        index = entry.index
+        if entry.loading:
+            widget = self._loading_pool.pop() if self._loading_pool else LoadingDots(
+                self,
+                fg_color=THEME['surface'],
+                corner_radius=20
+            )
+            widget.grid(row=index, column=0, padx=(20, 100), pady=5, sticky="w")
+            self.ticker.add(widget)
+        else:
+            if self._bubble_pool:
+                widget = self._bubble_pool.pop()
+                widget.set_message(entry.message, entry.is_user)
+            else:
+                widget = ChatBubbleFrame(self, entry.message, entry.is_user)
+            widget.grid(row=index, column=0, sticky="ew")
+        self._widgets[entry] = widget
+
+    def _release(self, entry):
+        widget = self._widgets.pop(entry)
+        widget.grid_forget()
+        if isinstance(widget, LoadingDots):
+            self.ticker.discard(widget)
+            self._loading_pool.append(widget)
+        else:
+            self._bubble_pool.append(widget)
+
+    def _on_canvas_scroll(self, first, last):
+        self._scrollbar.set(first, last)
+        if self._edge_check is None:
+            self._edge_check = self.after_idle(self._check_edges)
+
+    def _check_edges(self):
+        self._edge_check = None
+        first, last = self._parent_canvas.yview()
+        if last - first >= 1.0:
+            # Everything rendered fits on screen; there is no edge to reach
+            return
+        step = max(1, self.window_size // 2)
+        end = self._start + len(self._widgets)
+        if first <= 0.0 and self._start > 0:
+            new_start = max(0, self._start - step)
+            added = self._start - new_start
+            self._render_window(new_start)
+            # Keep the entry that was at the top in view
+            self.after_idle(lambda: self._parent_canvas.yview_moveto(added / self.window_size))
+        elif last >= 1.0 and end < len(self.entries):
+            new_start = min(len(self.entries) - self.window_size, self._start + step)
+            removed = new_start - self._start
+            self._render_window(new_start)
+            self.after_idle(lambda: self._parent_canvas.yview_moveto(
+                max(0.0, 1.0 - removed / self.window_size - (last - first))
+            ))
+        elif last >= 1.0 and self.on_end is not None:
+            self.on_end()
     
+    def is_at_bottom(self):
+        """Whether the newest entry is rendered and the view is scrolled all the way down"""
+        if self._start + len(self._widgets) < len(self.entries):
+            return False
+        return self._parent_canvas.yview()[1] >= 1.0
+
+    def request_scroll(self):
+        self.ui.coalesce((self, "scroll"), self._scroll_to_bottom)
+
+    def clear(self):
+        for entry in list(self._widgets):
+            self._release(entry)
+        self.entries = []
+        self._start = 0
+
     def _scroll_to_bottom(self):
         try:
+            if self._start + len(self._widgets) < len(self.entries):
+                self._render_window(max(0, len(self.entries) - self.window_size))
             self._parent_canvas.yview_moveto(1.0)
         except:
             pass
 
-    def add_loading_indicator(self):
-        loading_frame = LoadingDots(
-            self,
-            fg_color=THEME['surface'],
-            corner_radius=20
-        )
-        loading_frame.grid(row=len(self.grid_slaves()), column=0, padx=(20, 100), pady=5, sticky="w")
-        
-        return loading_frame
-
 class AIAssistantGUI(ctk.CTk):
     def __init__(self):
         super().__init__()
 
         self.config = ConfigManager()
         self.user_prefs = UserPreferences()
-        self.service_manager = ServiceIntegrationManager()
+        # Calendar and email access is set up on first use, off the UI thread
+        self.services = None
+        
+        # Worker pool for AI requests; sized per provider in setup_ai_provider
+        self.dispatcher = RequestDispatcher()
+        # Calendar/email calls, provider setup and file indexing run here, so they never wait
+        # behind a long generation, and an unanswered Google sign-in never holds up the chat
+        self.background = RequestDispatcher(max_workers=2)
+        # Results from the workers reach the widgets through here, in batches per frame
+        self.ui = UIDispatcher(self)
+        self.ui.start()
+        self.ticker = AnimationTicker(self)
+        # Handles of the requests that are queued or running, for the stop button
+        self.active_requests = set()
+        self.conversation = Conversation(self.config.get_context_tokens())
+        self.file_index = FileIndex()
+        # Providers for earlier settings stay warm, so switching back to them is instant
+        self.providers = ProviderPool()
         self.setup_ai_provider()
         
-        # Initialize request queue and processing flag
-        self.request_queue = []
-        self.is_processing = False
-        self.current_task = None
+        # Refresh the passage index for anything that changed since last run, once the provider is set up
+        self.background.submit(self._index_files, self.config.get_recent_files(), key=PROVIDER_SETUP)
         
         # Configure window
         self.title(self.user_prefs.get_preference("personalization", "assistant_name"))
@@ -213,6 +435,8 @@ class AIAssistantGUI(ctk.CTk):
         # Chat area with enhanced styling
         self.chat_frame = ScrollableChatFrame(
             self.main_content,
+            self.ui,
+            self.ticker,
             fg_color=THEME['surface'],
             corner_radius=15
         )
@@ -248,13 +472,29 @@ class AIAssistantGUI(ctk.CTk):
             height=40,
             corner_radius=20
         )
-        self.send_button.grid(row=0, column=1, padx=(10, 20), pady=15)
+        self.send_button.grid(row=0, column=1, padx=(10, 10), pady=15)
+        
+        # Stops every queued or running request
+        self.stop_button = AnimatedButton(
+            self.input_frame,
+            text="Stop",
+            command=self.stop_requests,
+            fg_color=THEME['primary'],
+            hover_color=THEME['secondary'],
+            font=("Helvetica", 14, "bold"),
+            width=80,
+            height=40,
+            corner_radius=20
+        )
+        self.stop_button.grid(row=0, column=2, padx=(0, 20), pady=15)
         
         # Bind Enter key
         self.input_field.bind("<Return>", self.send_message)
         
         # Show welcome message with typing animation
         self.after(500, lambda: self._show_welcome_message())
+        if self.config.load_error:
+            self.after(600, lambda: messagebox.showwarning("Settings", self.config.load_error))
 
     def _create_tooltip(self, widget, text):
         tooltip = ctk.CTkLabel(
@@ -280,17 +520,42 @@ class AIAssistantGUI(ctk.CTk):
 
     def setup_ai_provider(self):
         provider = self.config.get_ai_provider()
-        if provider == "ollama":
-            settings = self.config.get_ollama_settings()
-            self.ai_provider = OllamaProvider(settings["host"], settings["port"], settings["model"])
-        elif provider == "openai":
-            api_key = self.config.get_api_key("openai")
-            self.ai_provider = OpenAIProvider(api_key)
-        elif provider == "gemini":
-            api_key = self.config.get_api_key("gemini")
-            self.ai_provider = GeminiProvider(api_key)
-        else:
-            self.ai_provider = WebOnlyProvider()
+        self.provider_name = provider_class(provider).name
+        # Created (importing its client library) and warmed up in the background
+        self.provider_future = self.providers.get(provider, self.config.get_provider_settings(provider))
+        self.semantic_index = None
+        self.dispatcher.resize(self.config.get_concurrency(provider))
+        self.background.submit(
+            self._activate_provider,
+            self.provider_future,
+            self.config.get_timeouts(provider),
+            self.config.get_semantic_search(),
+            key=PROVIDER_SETUP
+        )
+    
+    @property
+    def ai_provider(self):
+        # Waits while a newly selected provider is being created, so only workers should use it
+        return self.provider_future.result()
+    
+    def _activate_provider(self, future, timeouts, semantic_search):
+        try:
+            provider = future.result()
+        except Exception as e:
+            print(f"Could not set up {self.provider_name}: {e}")
+            return
+        provider.set_timeouts(*timeouts)
+        if future is not self.provider_future:
+            # Another provider was selected meanwhile
+            return
+        
+        # Optional embedding search alongside the keyword index
+        if semantic_search and provider.supports_capability('embeddings'):
+            try:
+                from vector_store import SemanticIndex
+                self.semantic_index = SemanticIndex(provider)
+            except RuntimeError as e:
+                print(f"Semantic search disabled: {e}")
     
     def show_config_window(self):
         config_window = ctk.CTkToplevel(self)
@@ -366,40 +631,133 @@ class AIAssistantGUI(ctk.CTk):
         )
         
         if filename:
+            self.current_file = filename
+            self.config.add_recent_file(filename)
+            progress_bubble = self.chat_frame.add_message(f"Analyzing file: {filename}", is_user=False)
+            loading_frame = self.chat_frame.add_loading_indicator()
+            handle = self._start_request()
+            
+            def on_progress(done, total):
+                text = f"Analyzing file: {filename}\n{done}/{total} parts analyzed"
+                # Only the latest progress in a frame is shown
+                self.ui.coalesce((progress_bubble, "progress"), progress_bubble.set_text, text)
+            
+            def on_complete(response):
+                self.active_requests.discard(handle)
+                self.chat_frame.replace_with_message(loading_frame, response, is_user=False)
+                # Indexed after the analysis, so the text comes from the extraction cache
+                self.background.submit(self._index_files, [filename], key=PROVIDER_SETUP)
+            
+            self.dispatcher.submit(self._analyze_file_thread, filename, handle, on_progress, on_complete)
+    
+    def _index_files(self, paths):
+        self.file_index.update(paths)
+        semantic_index = self.semantic_index
+        if semantic_index is None:
+            return
+        for path in paths:
+            if os.path.exists(path):
+                try:
+                    semantic_index.add_file(path, self.file_index.passages(path))
+                except Exception as e:
+                    print(f"Could not embed {path}: {e}")
+    
+    def _build_files_prompt(self, question, files):
+        semantic_passages = []
+        if self.semantic_index is not None:
             try:
-                self.current_file = filename
-                self.file_content, file_type = FileHandler.read_file(filename)
-                self.chat_frame.add_message(f"Analyzing {file_type} file: {filename}\n\n", is_user=False)
+                semantic_passages = self.semantic_index.search_files(question, files)
             except Exception as e:
-                messagebox.showerror("Error", f"Failed to read file: {str(e)}")
+                print(f"Semantic search failed: {e}")
+        return self.file_index.build_prompt(question, files, extra_passages=semantic_passages)
     
-    def process_queue(self):
-        if self.is_processing or not self.request_queue:
+    def _analyze_file_thread(self, filename, handle, on_progress, callback):
+        if handle.cancelled:
+            self.ui.call(callback, STOPPED_MESSAGE)
             return
+        try:
+            segments, file_type = FileHandler.read_segments(filename, workers=self.config.get_pdf_workers())
+            response = self.ai_provider.analyze_chunks(
+                chunk_segments(segments),
+                file_type,
+                max_workers=self.config.get_concurrency(self.config.get_ai_provider()),
+                progress_callback=on_progress,
+                cancel=handle
+            )
+        except Exception as e:
+            response = f"Failed to analyze file: {str(e)}"
+        self.ui.call(callback, response)
+    
+    def _start_request(self):
+        handle = RequestHandle()
+        self.active_requests.add(handle)
+        return handle
+    
+    def stop_requests(self):
+        # Running requests close their connections; queued ones finish as soon as a worker picks them up
+        for handle in list(self.active_requests):
+            handle.cancel()
+    
+    def queue_request(self, task, loading_frame, key=None, build_prompt=None, on_response=None):
+        bubble = None
+        handle = self._start_request()
+        
+        def show_delta(text):
+            # The first tokens replace the loading indicator with a live bubble
+            nonlocal bubble
+            if bubble is None:
+                bubble = self.chat_frame.replace_with_message(loading_frame, text, is_user=False)
+            else:
+                self.chat_frame.append_to_message(bubble, text)
         
-        self.is_processing = True
-        task = self.request_queue.pop(0)
-        self.current_task = task
+        def on_delta(text):
+            # Called on the worker; deltas arriving within one frame are shown together
+            self.ui.append_text(loading_frame, text, show_delta)
         
         def on_complete(response):
-            self.is_processing = False
-            self.current_task = None
-            self.chat_frame.add_message(response, is_user=False)
-            self.after(100, self.process_queue)
-        
-        thread = threading.Thread(
-            target=self._process_task_thread,
-            args=(task, on_complete)
+            self.active_requests.discard(handle)
+            if bubble is None:
+                self.chat_frame.replace_with_message(loading_frame, response, is_user=False)
+            elif bubble.message != response:
+                bubble.set_text(response)
+        
+        self.dispatcher.submit(
+            self._process_task_thread, task, handle, on_complete, on_delta, build_prompt, on_response, key=key
         )
-        thread.start()
 
-    def _process_task_thread(self, task, callback):
+    def _process_task_thread(self, task, handle, callback, on_delta, build_prompt=None, on_response=None):
+        chunks = []
         try:
-            response = self.ai_provider.generate_response(task)
-            self.after(0, lambda: callback(response))
+            # A request stopped while it was queued never reaches the provider
+            if not handle.cancelled:
+                # Prompt building (e.g. fetching web sources) also happens off the UI thread;
+                # it gets the handle so model calls it makes stop with the request
+                prompt = build_prompt(task, handle) if build_prompt else task
+                stream = self.ai_provider.stream_response(prompt, handle)
+                try:
+                    for delta in stream:
+                        if handle.cancelled:
+                            break
+                        chunks.append(delta)
+                        on_delta(delta)
+                finally:
+                    stream.close()
+            response = ''.join(chunks)
+            if handle.cancelled:
+                self.ui.call(callback, response + ("\n\n" if chunks else "") + STOPPED_MESSAGE)
+                return
+            # Runs on the worker, before the next request with the same key can start
+            if on_response:
+                on_response(response)
+            self.ui.call(callback, response)
         except Exception as e:
-            error_msg = f"Error processing request: {str(e)}"
-            self.after(0, lambda: callback(error_msg))
+            if handle.cancelled:
+                error_msg = ''.join(chunks) + ("\n\n" if chunks else "") + STOPPED_MESSAGE
+            elif isinstance(e, ProviderError):
+                error_msg = ''.join(chunks) + ("\n\n" if chunks else "") + str(e)
+            else:
+                error_msg = ''.join(chunks) + ("\n\n" if chunks else "") + f"Error processing request: {str(e)}"
+            self.ui.call(callback, error_msg)
 
     def send_message(self, event=None):
         user_input = self.input_field.get()
@@ -410,6 +768,12 @@ class AIAssistantGUI(ctk.CTk):
             self.input_field.delete(0, 'end')
             query = user_input
             mode = "ai"
+            if query.startswith("/web "):
+                mode = "web"
+                query = query[len("/web "):].strip()
+            elif query.startswith("/files "):
+                mode = "files"
+                query = query[len("/files "):].strip()
             
             if not query:
                 messagebox.showwarning("Warning", "Please enter a query or select a file to analyze.")
@@ -418,114 +782,219 @@ class AIAssistantGUI(ctk.CTk):
             # Add loading indicator
             loading_frame = self.chat_frame.add_loading_indicator()
             
-            # Add to queue and process
-            self.request_queue.append(query)
-            self.process_queue()
+            if mode == "web" and self.provider_name == "none":
+                # Without a model, show the search results themselves
+                self.dispatcher.submit(self._web_search_thread, query, loading_frame)
+            elif mode == "web":
+                self.queue_request(query, loading_frame, build_prompt=self._build_web_prompt)
+            elif mode == "files":
+                # Only the passages relevant to the question are sent, not the whole documents
+                recent_files = self.config.get_recent_files()
+                self.queue_request(
+                    query,
+                    loading_frame,
+                    build_prompt=lambda question, handle: self._build_files_prompt(question, recent_files)
+                )
+            else:
+                # Turns of one conversation build on each other, so they run in order
+                self.queue_request(
+                    query,
+                    loading_frame,
+                    key=CHAT_CONVERSATION,
+                    build_prompt=self._build_chat_prompt,
+                    on_response=lambda response, question=query: self._remember_exchange(question, response)
+                )
     
-    def show_calendar(self):
-        if not self.service_manager.credentials:
-            if not self.service_manager.authenticate():
-                messagebox.showerror("Authentication Error", "Failed to authenticate with Google services")
-                return
-        
-        result = self.service_manager.get_calendar_events()
-        if 'error' in result:
-            messagebox.showerror("Error", f"Failed to fetch calendar events: {result['error']}")
-            return
-            
-        events = result.get('events', [])
-        if events:
-            event_window = ctk.CTkToplevel(self)
-            event_window.title("Calendar Events")
-            event_window.geometry("600x400")
-            
-            # Create header
-            header = ctk.CTkLabel(
-                event_window,
-                text="Upcoming Calendar Events",
-                font=("Helvetica", 16, "bold"),
-                text_color=THEME['text']
+    def _build_web_prompt(self, question, handle):
+        from web_retrieval import build_grounded_prompt
+        return build_grounded_prompt(question)
+    
+    def _build_chat_prompt(self, question, handle):
+        provider = self.ai_provider
+        summarizer = None
+        if provider.name != "none":
+            def summarizer(summary_prompt):
+                summary = ''.join(provider.stream_response(summary_prompt, handle))
+                if handle.cancelled:
+                    # A cut-off summary must not replace the stored one
+                    raise CancelledError()
+                return summary
+        return self.conversation.build_prompt(question, summarizer)
+    
+    def _remember_exchange(self, question, response):
+        # Only called for completed replies, so stopped or failed turns leave no trace
+        self.conversation.add_exchange(question, response)
+        # Chat history is embedded in the background so it can be searched later
+        if self.semantic_index is not None:
+            self.dispatcher.submit(
+                self.semantic_index.add_texts, "chat", [f"User: {question}\nAssistant: {response}"]
+            )
+    
+    def _web_search_thread(self, query, loading_frame):
+        from web_search import search_many, search_web, split_queries
+        queries = split_queries(query)
+        if len(queries) > 1:
+            # Several queries separated by ";" are searched at the same time
+            results = '\n'.join(
+                f"Results for \"{subquery}\":\n{formatted}"
+                for subquery, formatted in zip(queries, search_many(queries))
             )
-            header.pack(pady=10)
-            
-            event_frame = ScrollableChatFrame(event_window)
-            event_frame.pack(fill="both", expand=True, padx=10, pady=10)
-            
-            for event in events:
-                summary = event.get('summary', 'No Title')
-                start = event.get('start', {}).get('dateTime', event.get('start', {}).get('date', 'N/A'))
-                location = event.get('location', 'No Location')
-                
-                # Format the date/time
-                try:
-                    if 'T' in start:  # DateTime format
-                        dt = datetime.fromisoformat(start.replace('Z', '+00:00'))
-                        formatted_time = dt.strftime("%B %d, %Y at %I:%M %p")
-                    else:  # Date only format
-                        dt = datetime.fromisoformat(start)
-                        formatted_time = dt.strftime("%B %d, %Y")
-                except:
-                    formatted_time = start
-                
-                event_text = f"📅 {summary}\n🕒 {formatted_time}\n📍 {location}"
-                event_frame.add_message(event_text, False)
         else:
-            messagebox.showinfo("Calendar", "No upcoming events found")
-
+            results = search_web(query)
+        self.ui.call(self.chat_frame.replace_with_message, loading_frame, results)
+    
+    def _get_services(self):
+        # Created on first use; nothing is authenticated or fetched at startup
+        if self.services is None:
+            self.services = ServiceLayer(
+                self._create_service_backend,
+                self.background.submit,
+                max_age=self.user_prefs.get_preference("services", "refresh_seconds") or 300
+            )
+        return self.services
+    
+    def _create_service_backend(self):
+        if self.user_prefs.get_preference("services", "backend") == "local":
+            return LocalServiceBackend()
+        return ServiceIntegrationManager()
+    
+    def show_calendar(self):
+        self._show_service_window(
+            "calendar",
+            "Calendar Events",
+            "Upcoming Calendar Events",
+            self._format_event,
+            "No upcoming events found"
+        )
+    
     def show_emails(self):
-        if not self.service_manager.credentials:
-            if not self.service_manager.authenticate():
-                messagebox.showerror("Authentication Error", "Failed to authenticate with Google services")
+        # Headers come from the local mail store; older pages load as the list is scrolled
+        self._show_service_window(
+            "email",
+            "Recent Emails",
+            "Recent Emails",
+            self._format_email,
+            "No recent emails found",
+            load_more=self._get_services().load_more
+        )
+    
+    def _show_service_window(self, kind, title, header_text, format_item, empty_text, load_more=None):
+        """
+        Opens right away with the cached items, then updates them when a background refresh
+        finishes. With load_more, further pages are requested when the list is scrolled to its end.
+        """
+        services = self._get_services()
+        window = ctk.CTkToplevel(self)
+        window.title(title)
+        window.geometry("600x400")
+        
+        # Create header
+        header = ctk.CTkLabel(
+            window,
+            text=header_text,
+            font=("Helvetica", 16, "bold"),
+            text_color=THEME['text']
+        )
+        header.pack(pady=10)
+        
+        status = ctk.CTkLabel(window, text="", text_color=THEME['text_secondary'])
+        status.pack()
+        
+        item_frame = ScrollableChatFrame(window, self.ui, self.ticker)
+        item_frame.pack(fill="both", expand=True, padx=10, pady=10)
+        
+        paging = {"loaded": 0, "generation": 0, "loading": False, "done": False}
+        
+        def show(entry):
+            item_frame.clear()
+            for item in entry["items"]:
+                item_frame.add_message(format_item(item), False)
+            # Pages requested for the previous list are dropped
+            paging.update(loaded=len(entry["items"]), generation=paging["generation"] + 1, loading=False, done=False)
+            updated = datetime.fromtimestamp(entry["updated"]).strftime("%I:%M %p")
+            status.configure(text=f"Updated {updated}" if entry["items"] else empty_text)
+        
+        def add_page(items, generation):
+            if not window.winfo_exists() or generation != paging["generation"]:
                 return
+            for item in items:
+                item_frame.add_message(format_item(item), False, scroll=False)
+            paging.update(loaded=paging["loaded"] + len(items), loading=False, done=not items)
         
-        result = self.service_manager.get_emails()
-        if 'error' in result:
-            messagebox.showerror("Error", f"Failed to fetch emails: {result['error']}")
-            return
-            
-        emails = result.get('messages', [])
-        if emails:
-            email_window = ctk.CTkToplevel(self)
-            email_window.title("Recent Emails")
-            email_window.geometry("600x400")
-            
-            # Create header
-            header = ctk.CTkLabel(
-                email_window,
-                text="Recent Emails",
-                font=("Helvetica", 16, "bold"),
-                text_color=THEME['text']
-            )
-            header.pack(pady=10)
-            
-            email_frame = ScrollableChatFrame(email_window)
-            email_frame.pack(fill="both", expand=True, padx=10, pady=10)
-            
-            for email in emails:
-                subject = email.get('subject', 'No Subject')
-                sender = email.get('from', 'Unknown Sender')
-                date = email.get('date', 'No Date')
-                
-                try:
-                    dt = datetime.strptime(date, "%a, %d %b %Y %H:%M:%S %z")
-                    formatted_date = dt.strftime("%B %d, %Y at %I:%M %p")
-                except:
-                    formatted_date = date
-                
-                email_text = f"📧 {subject}\n👤 From: {sender}\n🕒 {formatted_date}"
-                email_frame.add_message(email_text, False)
+        def on_end():
+            if paging["loading"] or paging["done"]:
+                return
+            paging["loading"] = True
+            generation = paging["generation"]
+            load_more(paging["loaded"], lambda items: self.ui.call(add_page, items, generation))
+        
+        if load_more is not None:
+            item_frame.on_end = on_end
+        
+        def on_update(entry):
+            if not window.winfo_exists():
+                return
+            if "error" in entry:
+                status.configure(text=f"Could not refresh: {entry['error']}")
+            else:
+                show(entry)
+        
+        cached = services.cached(kind)
+        if cached:
+            show(cached)
         else:
-            messagebox.showinfo("Email", "No recent emails found")
+            status.configure(text="Loading...")
+        services.refresh(kind, lambda entry: self.ui.call(on_update, entry), force=cached is None)
+    
+    @staticmethod
+    def _format_event(event):
+        summary = event.get('summary', 'No Title')
+        start = event.get('start', {}).get('dateTime', event.get('start', {}).get('date', 'N/A'))
+        location = event.get('location', 'No Location')
+        
+        # Format the date/time
+        try:
+            if 'T' in start:  # DateTime format
+                dt = datetime.fromisoformat(start.replace('Z', '+00:00'))
+                formatted_time = dt.strftime("%B %d, %Y at %I:%M %p")
+            else:  # Date only format
+                dt = datetime.fromisoformat(start)
+                formatted_time = dt.strftime("%B %d, %Y")
+        except:
+            formatted_time = start
+        
+        return f"📅 {summary}\n🕒 {formatted_time}\n📍 {location}"
+    
+    @staticmethod
+    def _format_email(email):
+        subject = email.get('subject', 'No Subject')
+        sender = email.get('from', 'Unknown Sender')
+        date = email.get('date', 'No Date')
+        
+        try:
+            dt = datetime.strptime(date, "%a, %d %b %Y %H:%M:%S %z")
+            formatted_date = dt.strftime("%B %d, %Y at %I:%M %p")
+        except:
+            formatted_date = date
+        
+        return f"📧 {subject}\n👤 From: {sender}\n🕒 {formatted_date}"
 
     def on_closing(self):
+        self.stop_requests()
+        self.dispatcher.shutdown()
+        self.background.shutdown()
+        self.ui.stop()
+        self.ticker.stop()
+        self.config.flush()
         try:
-            if hasattr(self, 'ai_provider'):
-                self.ai_provider.cleanup()
+            self.providers.shutdown()
         except:
             pass
         self.quit()
         self.destroy()
 
 if __name__ == "__main__":
+    # Needed for the PDF extraction process pool in the frozen build
+    multiprocessing.freeze_support()
     app = AIAssistantGUI()
     app.mainloop()
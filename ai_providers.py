@@ -1,44 +1,288 @@
-import requests
 import json
+import itertools
+import socket
+import threading
+import time
 from abc import ABC, abstractmethod
-import google.generativeai as genai
-import openai
+from collections import OrderedDict
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Type
+from response_cache import CacheKey, get_shared_cache
+from request_dispatcher import RequestHandle
+from chunking import DEFAULT_CHUNK_TOKENS, chunk_segments, estimate_tokens, truncate_tokens
+
+# Client libraries are imported by the provider that needs them, when it is created
+if TYPE_CHECKING:
+    import requests
+
+PROVIDERS: Dict[str, Type['AIProvider']] = {}
+
+def register_provider(provider_class: Type['AIProvider']) -> Type['AIProvider']:
+    """Class decorator that makes a provider available to create_provider under its name"""
+    PROVIDERS[provider_class.name] = provider_class
+    return provider_class
+
+class ProviderError(Exception):
+    """A request to the model failed; the message is meant for the user"""
+
+def provider_class(name: str) -> Type['AIProvider']:
+    """The provider registered under name, falling back to web-only mode"""
+    return PROVIDERS.get(name, PROVIDERS["none"])
+
+def create_provider(name: str, settings: Optional[Dict] = None) -> 'AIProvider':
+    """Creates the provider registered under name, falling back to web-only mode"""
+    return provider_class(name)(**(settings or {}))
+
+class ProviderPool:
+    """
+    Provider instances keyed by name and settings, so switching back to earlier settings
+    reuses the instance with its connections instead of building a new one. Instances are
+    created on a background thread, which also keeps client imports and global setup off
+    the UI thread, and warmed up in the background each time they are selected. The least
+    recently used ones beyond max_size are cleaned up.
+    """
+    def __init__(self, max_size: int = 4):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._providers: 'OrderedDict[Tuple, Future]' = OrderedDict()
+        # One thread, so client libraries with global configuration are set up one at a time
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="provider-setup")
+
+    def get(self, name: str, settings: Optional[Dict] = None) -> Future:
+        """Returns a Future for the provider with these settings, creating it if needed"""
+        settings = settings or {}
+        key = (provider_class(name).name, json.dumps(settings, sort_keys=True))
+        with self._lock:
+            future = self._providers.get(key)
+            if future is not None:
+                self._providers.move_to_end(key)
+                # The server may have unloaded the model since it was last used
+                future.add_done_callback(self._warm_up)
+                return future
+            future = self._executor.submit(create_provider, name, settings)
+            self._providers[key] = future
+            evicted = []
+            if provider_class(name).single_instance:
+                # The client's settings are process-wide, so older instances would use the new ones
+                evicted = [old_key for old_key in self._providers if old_key[0] == key[0] and old_key != key]
+            kept = [old_key for old_key in self._providers if old_key not in evicted]
+            evicted += kept[:max(0, len(kept) - self.max_size)]
+            for old_key in evicted:
+                self._release(self._providers.pop(old_key))
+        future.add_done_callback(lambda done: self._forget_failed(key, done))
+        future.add_done_callback(self._warm_up)
+        return future
+
+    def shutdown(self):
+        """Cleans up every instance; providers still being created are cleaned up when they finish"""
+        with self._lock:
+            futures = list(self._providers.values())
+            self._providers.clear()
+        for future in futures:
+            self._release(future)
+        self._executor.shutdown(wait=False)
+
+    @staticmethod
+    def _warm_up(future: Future):
+        # Warming up can take as long as loading a model, so it does not delay switching
+        if future.exception() is None:
+            threading.Thread(target=future.result().warm_up, daemon=True).start()
+
+    def _forget_failed(self, key: Tuple, future: Future):
+        # A failed setup is not kept, so selecting the same settings again retries it
+        if future.exception() is None:
+            return
+        with self._lock:
+            if self._providers.get(key) is future:
+                del self._providers[key]
+
+    @staticmethod
+    def _release(future: Future):
+        def cleanup(done: Future):
+            if done.exception() is None:
+                done.result().cleanup()
+        future.add_done_callback(cleanup)
+
+def _abort_response(response: 'requests.Response'):
+    """
+    Closes a streaming response from another thread. Closing alone does not wake a
+    read that is blocked on the socket, so the socket is shut down first.
+    """
+    fp = getattr(getattr(response.raw, '_fp', None), 'fp', None)
+    sock = getattr(getattr(fp, 'raw', None), '_sock', None)
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+    response.close()
 
 class AIProvider(ABC):
+    name = "none"
+    single_instance = False  # set when the client library is configured process-wide
+
     def __init__(self):
         self.capabilities = {
             'streaming': False,
             'file_analysis': False,
             'code_completion': False,
-            'multimodal': False
+            'multimodal': False,
+            'embeddings': False
         }
-        self._response_cache = {}
+        self.model_name = ""
+        self.embedding_model = ""
+        self.system_prompt = ""
+        self.generation_params = {}
+        self._response_cache = get_shared_cache()
         self.max_retries = 3
         self.base_delay = 2
+        self.connect_timeout = 5
+        self.read_timeout = 60
 
     @abstractmethod
     def generate_response(self, prompt: str) -> str:
         pass
 
-    @abstractmethod
-    def analyze_file(self, file_content: str, file_type: str) -> str:
-        pass
+    def analyze_file(self, file_content: str, file_type: str, cancel: Optional[RequestHandle] = None) -> str:
+        prompt = f"Please analyze this {file_type} content:\n\n{file_content}"
+        return ''.join(self.stream_response(prompt, cancel))
+
+    def analyze_chunks(self, chunks: Iterable[str], file_type: str, max_workers: int = 2,
+                       max_tokens: int = DEFAULT_CHUNK_TOKENS,
+                       progress_callback: Optional[Callable[[int, int], None]] = None,
+                       cancel: Optional[RequestHandle] = None) -> str:
+        """
+        Map-reduce analysis of a document that is too large for one prompt.
+        Chunks are analyzed in parallel as they arrive, then the partial analyses
+        are merged (in several rounds if needed) into a single answer.
+        progress_callback receives (chunks_done, chunks_submitted). Cancelling
+        stops submitting parts, drops the ones that have not started and stops
+        the requests that are running.
+        """
+        cancel = cancel or RequestHandle()
+        chunk_iter = iter(chunks)
+        first = next(chunk_iter, None)
+        if first is None:
+            return f"The {file_type} file appears to be empty."
+        second = next(chunk_iter, None)
+        if second is None:
+            # Small documents keep the plain single-prompt analysis
+            return self.analyze_file(first, file_type, cancel)
+
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            futures = []
+            done = 0
+            lock = threading.Lock()
+
+            def report(_future):
+                nonlocal done
+                with lock:
+                    done += 1
+                    progress = (done, len(futures))
+                if progress_callback:
+                    progress_callback(*progress)
+
+            for index, chunk in enumerate(itertools.chain([first, second], chunk_iter), 1):
+                if cancel.cancelled:
+                    break
+                with lock:
+                    future = executor.submit(self._analyze_part, chunk, file_type, index, cancel)
+                    futures.append(future)
+                future.add_done_callback(report)
+
+            cancel.on_cancel(lambda: [future.cancel() for future in futures])
+            try:
+                partials = [future.result() for future in futures]
+            except CancelledError:
+                partials = None
+            if cancel.cancelled:
+                return "File analysis stopped."
+            analysis = self._reduce_analyses(partials, file_type, executor, max_tokens, cancel)
+            if cancel.cancelled:
+                return "File analysis stopped."
+            return analysis
+
+    def _analyze_part(self, chunk: str, file_type: str, index: int, cancel: RequestHandle) -> str:
+        prompt = (f"Please analyze part {index} of a larger {file_type} document. "
+                  f"Summarize its key points so they can be combined with the other parts:\n\n{chunk}")
+        return ''.join(self.stream_response(prompt, cancel))
+
+    def _reduce_analyses(self, partials: List[str], file_type: str, executor: ThreadPoolExecutor,
+                         max_tokens: int, cancel: RequestHandle) -> str:
+        separator = "\n\n---\n\n"
+        combine = (f"These are analyses of consecutive parts of one {file_type} document. "
+                   f"Combine them into a single coherent analysis of the whole document:\n\n")
+        merge = f"Merge these partial analyses of a {file_type} document into one summary:\n\n"
+        # Room left for the analyses once the instructions are in the prompt
+        budget = max(2, max_tokens - estimate_tokens(combine))
+        while True:
+            if cancel.cancelled:
+                return ""
+            groups = list(chunk_segments(partials, budget, separator=separator))
+            if len(groups) <= 1:
+                return ''.join(self.stream_response(combine + (groups[0] if groups else ""), cancel))
+            if len(groups) >= len(partials):
+                # Too long to pair up; trimmed to half the budget, each round at least halves them
+                partials = [truncate_tokens(partial, budget // 2 - estimate_tokens(separator))
+                            for partial in partials]
+                continue
+            partials = list(executor.map(
+                lambda group: ''.join(self.stream_response(merge + group, cancel)),
+                groups
+            ))
+
+    def stream_response(self, prompt: str, cancel: Optional[RequestHandle] = None) -> Iterator[str]:
+        """
+        Yields the response as text deltas. Providers without native streaming yield it whole.
+        Closing the generator before it is exhausted, or cancelling the handle, stops the
+        request and releases its connection. A failed request raises ProviderError, so
+        error messages are never mistaken for a reply.
+        """
+        if cancel is None or not cancel.cancelled:
+            yield self.generate_response(prompt)
+
+    def set_timeouts(self, connect: float, read: float):
+        """Seconds to wait for a connection, and for each read of the response"""
+        self.connect_timeout = connect
+        self.read_timeout = read
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """Returns one embedding vector per text, computed in a single batched request"""
+        raise NotImplementedError(f"{type(self).__name__} does not support embeddings")
 
     def supports_capability(self, capability: str) -> bool:
         return self.capabilities.get(capability, False)
 
+    def warm_up(self):
+        """Prepares for the first request, e.g. by connecting or loading the model; runs in the background"""
+        pass
+
+    def cleanup(self):
+        """Releases connections and other resources held by the provider"""
+        pass
+
+    def _cache_key(self, prompt: str) -> CacheKey:
+        return CacheKey(
+            provider=self.name,
+            model=self.model_name,
+            prompt=prompt,
+            system_prompt=self.system_prompt,
+            params=self.generation_params
+        )
+
     def _cached_response(self, prompt: str) -> str | None:
-        return self._response_cache.get(prompt)
+        return self._response_cache.get(self._cache_key(prompt))
 
     def _cache_response(self, prompt: str, response: str):
-        self._response_cache[prompt] = response
-        if len(self._response_cache) > 1000:  # Prevent unlimited growth
-            self._response_cache.pop(next(iter(self._response_cache)))
+        if response:
+            self._response_cache.put(self._cache_key(prompt), response)
 
-    def _handle_rate_limit(self, attempt: int) -> bool:
+    def _handle_rate_limit(self, attempt: int, cancel: Optional[RequestHandle] = None) -> bool:
         if attempt < self.max_retries - 1:
             delay = self.base_delay * (2 ** attempt)
-            import time
+            if cancel is not None:
+                # Stopping the request ends the backoff right away
+                return not cancel.wait(delay)
             time.sleep(delay)
             return True
         return False
@@ -56,98 +300,326 @@ class AIProvider(ABC):
         else:
             return f"Error in {context}: {error_type} - {str(e)}"
 
+@register_provider
 class OllamaProvider(AIProvider):
-    def __init__(self, host: str, port: str, model: str):
+    name = "ollama"
+
+    def __init__(self, host: str, port: str, model: str, embedding_model: str = "nomic-embed-text",
+                 pool_size: int = 4, http_retries: int = 2, keep_alive: str = "30m"):
         super().__init__()
         self.base_url = f"{host}:{port}"
-        self.model = model
+        self.model_name = model
+        self.embedding_model = embedding_model
+        # How long Ollama keeps the model loaded after the last request
+        self.keep_alive = keep_alive
         self.capabilities['streaming'] = True
+        self.capabilities['embeddings'] = True
+        # Loading a model into memory can take minutes before the first token
+        self.read_timeout = 300
+        self._stats_lock = threading.Lock()
+        self._connects = 0
+        self.session = self._create_session(pool_size, http_retries, self._count_connect)
+
+    @staticmethod
+    def _create_session(pool_size: int, http_retries: int,
+                        on_connect: Callable[[], None]) -> 'requests.Session':
+        """
+        Keep-alive session, so requests reuse connections instead of opening one each.
+        on_connect is called for every connect, including reconnects of dropped
+        connections, which urllib3 does on the same connection object.
+        """
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+        from urllib3.util.retry import Retry
+
+        def counting(pool_class):
+            class CountingConnection(pool_class.ConnectionCls):
+                def connect(self):
+                    on_connect()
+                    super().connect()
+            return type(pool_class.__name__, (pool_class,), {"ConnectionCls": CountingConnection})
+
+        retry = Retry(
+            total=http_retries,
+            read=0,  # a response that started streaming is never replayed
+            backoff_factor=0.5,
+            status_forcelist=(502, 503, 504),  # Ollama answers 503 while its queue is full
+            allowed_methods=None,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        adapter.poolmanager.pool_classes_by_scheme = {
+            "http": counting(HTTPConnectionPool),
+            "https": counting(HTTPSConnectionPool)
+        }
+        session = requests.Session()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def _count_connect(self):
+        with self._stats_lock:
+            self._connects += 1
+
+    def connection_stats(self) -> Dict[str, int]:
+        """Requests sent and connects made so far; the difference was served by reused connections"""
+        requests_sent = 0
+        for adapter in set(self.session.adapters.values()):
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools.get(key)
+                if pool is not None:
+                    requests_sent += pool.num_requests
+        with self._stats_lock:
+            connections = self._connects
+        return {"requests": requests_sent, "connections": connections,
+                "reused": max(0, requests_sent - connections)}
+
+    def warm_up(self):
+        """Loads the model into memory; a generate request without a prompt only does that"""
+        try:
+            response = self.session.post(
+                f"{self.base_url}/api/generate",
+                json={"model": self.model_name, "keep_alive": self.keep_alive},
+                timeout=(self.connect_timeout, self.read_timeout)
+            )
+            response.close()
+        except Exception as e:
+            print(f"Could not load Ollama model {self.model_name}: {e}")
+
+    def cleanup(self):
+        self.session.close()
 
     def generate_response(self, prompt: str) -> str:
+        return ''.join(self.stream_response(prompt))
+
+    def stream_response(self, prompt: str, cancel: Optional[RequestHandle] = None) -> Iterator[str]:
+        cancel = cancel or RequestHandle()
         cached_response = self._cached_response(prompt)
         if cached_response:
-            return cached_response
+            yield cached_response
+            return
+        if cancel.cancelled:
+            return
 
         try:
-            response = requests.post(
+            payload = {"model": self.model_name, "prompt": prompt, "keep_alive": self.keep_alive}
+            if self.system_prompt:
+                payload["system"] = self.system_prompt
+            if self.generation_params:
+                payload["options"] = self.generation_params
+            response = self.session.post(
                 f"{self.base_url}/api/generate",
-                json={"model": self.model, "prompt": prompt},
-                stream=True
+                json=payload,
+                stream=True,
+                timeout=(self.connect_timeout, self.read_timeout)
             )
-            if response.status_code == 200:
-                full_response = ""
-                for line in response.iter_lines():
-                    if line:
-                        try:
-                            json_response = json.loads(line)
-                            if 'response' in json_response:
-                                full_response += json_response['response']
-                        except json.JSONDecodeError:
-                            continue
-                self._cache_response(prompt, full_response)
-                return full_response
-            return f"Error: {response.status_code}"
         except Exception as e:
-            return self._handle_error(e, "Ollama")
+            raise ProviderError(self._handle_error(e, "Ollama")) from e
 
-    def analyze_file(self, file_content: str, file_type: str) -> str:
-        prompt = f"Please analyze this {file_type} content:\n\n{file_content}"
-        return self.generate_response(prompt)
+        # Cancelling closes the connection, which also interrupts a blocked read. Once the
+        # response is done its connection is back in the pool, so cancelling must not touch it.
+        abort_lock = threading.Lock()
+        finished = False
+
+        def abort():
+            with abort_lock:
+                if not finished:
+                    _abort_response(response)
+
+        cancel.on_cancel(abort)
+        try:
+            if response.status_code != 200:
+                raise ProviderError(f"Error: {response.status_code}")
+            parts = []
+            for line in response.iter_lines():
+                if cancel.cancelled:
+                    return
+                if not line:
+                    continue
+                try:
+                    json_response = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                delta = json_response.get('response')
+                if delta:
+                    parts.append(delta)
+                    yield delta
+                if json_response.get('done'):
+                    break
+            self._cache_response(prompt, ''.join(parts))
+        except ProviderError:
+            raise
+        except Exception as e:
+            if not cancel.cancelled:
+                raise ProviderError(self._handle_error(e, "Ollama")) from e
+        finally:
+            with abort_lock:
+                finished = True
+            cancel.remove_callback(abort)
+            response.close()
 
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        response = self.session.post(
+            f"{self.base_url}/api/embed",
+            json={"model": self.embedding_model, "input": texts},
+            timeout=(self.connect_timeout, self.read_timeout)
+        )
+        response.raise_for_status()
+        return response.json()["embeddings"]
+
+@register_provider
 class OpenAIProvider(AIProvider):
+    name = "openai"
+
     def __init__(self, api_key: str):
         super().__init__()
-        openai.api_key = api_key
+        import openai
+        self.client = openai.OpenAI(api_key=api_key)
+        self.model_name = "gpt-3.5-turbo"
+        self.embedding_model = "text-embedding-3-small"
+        self.capabilities['streaming'] = True
         self.capabilities['code_completion'] = True
+        self.capabilities['embeddings'] = True
+
+    def warm_up(self):
+        """Opens the connection ahead of the first request; this also checks the API key"""
+        try:
+            self.client.models.retrieve(self.model_name, timeout=self._timeout())
+        except Exception as e:
+            print(self._handle_error(e, "OpenAI"))
 
     def generate_response(self, prompt: str) -> str:
+        return ''.join(self.stream_response(prompt))
+
+    def stream_response(self, prompt: str, cancel: Optional[RequestHandle] = None) -> Iterator[str]:
+        cancel = cancel or RequestHandle()
         cached_response = self._cached_response(prompt)
         if cached_response:
-            return cached_response
+            yield cached_response
+            return
+        if cancel.cancelled:
+            return
 
         try:
-            response = openai.ChatCompletion.create(
-                model="gpt-3.5-turbo",
-                messages=[{"role": "user", "content": prompt}]
+            messages = [{"role": "user", "content": prompt}]
+            if self.system_prompt:
+                messages.insert(0, {"role": "system", "content": self.system_prompt})
+            stream = self.client.chat.completions.create(
+                model=self.model_name,
+                messages=messages,
+                stream=True,
+                timeout=self._timeout(),
+                **self.generation_params
             )
-            self._cache_response(prompt, response.choices[0].message.content)
-            return response.choices[0].message.content
         except Exception as e:
-            return self._handle_error(e, "OpenAI")
+            raise ProviderError(self._handle_error(e, "OpenAI")) from e
 
-    def analyze_file(self, file_content: str, file_type: str) -> str:
-        prompt = f"Please analyze this {file_type} content:\n\n{file_content}"
-        return self.generate_response(prompt)
+        cancel.on_cancel(stream.close)
+        try:
+            parts = []
+            for chunk in stream:
+                if cancel.cancelled:
+                    return
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    parts.append(delta)
+                    yield delta
+            self._cache_response(prompt, ''.join(parts))
+        except Exception as e:
+            if not cancel.cancelled:
+                raise ProviderError(self._handle_error(e, "OpenAI")) from e
+        finally:
+            cancel.remove_callback(stream.close)
+            stream.close()
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        response = self.client.embeddings.create(
+            model=self.embedding_model,
+            input=texts,
+            timeout=self._timeout()
+        )
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
 
+    def _timeout(self):
+        import openai
+        return openai.Timeout(self.read_timeout, connect=self.connect_timeout)
+
+@register_provider
 class GeminiProvider(AIProvider):
+    name = "gemini"
+    single_instance = True  # genai.configure sets the API key for the whole process
+
     def __init__(self, api_key: str):
         super().__init__()
+        import google.generativeai as genai
         genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel('gemini-pro')
+        self.model_name = 'gemini-pro'
+        self.model = genai.GenerativeModel(self.model_name)
+        self.embedding_model = 'models/embedding-001'
+        self.capabilities['streaming'] = True
         self.capabilities['multimodal'] = True
+        self.capabilities['embeddings'] = True
 
     def generate_response(self, prompt: str) -> str:
+        return ''.join(self.stream_response(prompt))
+
+    def stream_response(self, prompt: str, cancel: Optional[RequestHandle] = None) -> Iterator[str]:
+        cancel = cancel or RequestHandle()
         cached_response = self._cached_response(prompt)
         if cached_response:
-            return cached_response
+            yield cached_response
+            return
 
         for attempt in range(self.max_retries):
+            if cancel.cancelled:
+                return
+            streamed = False
             try:
-                response = self.model.generate_content(prompt)
-                self._cache_response(prompt, response.text)
-                return response.text
+                parts = []
+                # The Gemini client has no separate connect timeout; the read timeout bounds the call
+                for chunk in self.model.generate_content(
+                    prompt,
+                    generation_config=self.generation_params or None,
+                    stream=True,
+                    request_options={"timeout": self.read_timeout}
+                ):
+                    if cancel.cancelled:
+                        return
+                    text = chunk.text
+                    if text:
+                        streamed = True
+                        parts.append(text)
+                        yield text
+                self._cache_response(prompt, ''.join(parts))
+                return
             except Exception as e:
-                if self._handle_rate_limit(attempt):
+                # Only retry while nothing has been shown to the user yet
+                if not streamed and self._handle_rate_limit(attempt, cancel):
                     continue
-                return self._handle_error(e, "Gemini")
+                if cancel.cancelled:
+                    return
+                raise ProviderError(self._handle_error(e, "Gemini")) from e
 
-    def analyze_file(self, file_content: str, file_type: str) -> str:
-        prompt = f"Please analyze this {file_type} content:\n\n{file_content}"
-        return self.generate_response(prompt)
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        import google.generativeai as genai
+        result = genai.embed_content(
+            model=self.embedding_model,
+            content=texts,
+            request_options={"timeout": self.read_timeout}
+        )
+        return result['embedding']
 
+@register_provider
 class WebOnlyProvider(AIProvider):
     def generate_response(self, prompt: str) -> str:
         return "Web-only mode does not provide AI responses. Please use the web search feature."
 
-    def analyze_file(self, file_content: str, file_type: str) -> str:
+    def analyze_file(self, file_content: str, file_type: str, cancel: Optional[RequestHandle] = None) -> str:
         return "File analysis is not available in web-only mode. Please configure an AI provider."
+
+    def analyze_chunks(self, chunks: Iterable[str], file_type: str, **kwargs) -> str:
+        return self.analyze_file("", file_type)
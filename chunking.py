@@ -0,0 +1,71 @@
+import re
+from typing import Iterable, Iterator, List
+
+DEFAULT_CHUNK_TOKENS = 3000
+
+STOPWORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'how', 'in', 'is', 'it',
+    'of', 'on', 'or', 'that', 'the', 'this', 'to', 'was', 'what', 'when', 'where', 'which',
+    'who', 'why', 'with'
+}
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token), good enough for budgeting"""
+    return (len(text) + 3) // 4
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """Cuts text to roughly max_tokens, at a line break when one is close to the cut"""
+    max_chars = max(1, max_tokens) * 4
+    if len(text) <= max_chars:
+        return text
+    cut = text.rfind('\n', max_chars // 2, max_chars)
+    return text[:cut if cut > 0 else max_chars].rstrip()
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens without common stopwords, for keyword matching"""
+    return [token for token in re.findall(r'\w+', text.lower()) if token not in STOPWORDS]
+
+def chunk_segments(segments: Iterable[str], max_tokens: int = DEFAULT_CHUNK_TOKENS,
+                   separator: str = "\n\n") -> Iterator[str]:
+    """
+    Packs natural segments (pages, paragraphs, row blocks) into chunks that stay
+    within max_tokens. Segments are only split when a single one is over budget.
+    Chunks are yielded as soon as they are full, so callers can start on them
+    before the source has been read completely.
+    """
+    current = []
+    current_tokens = 0
+    for segment in segments:
+        if not segment or not segment.strip():
+            continue
+        for piece in _split_oversized(segment, max_tokens):
+            tokens = estimate_tokens(piece)
+            if current and current_tokens + tokens > max_tokens:
+                yield separator.join(current)
+                current = []
+                current_tokens = 0
+            current.append(piece)
+            current_tokens += tokens
+    if current:
+        yield separator.join(current)
+
+def _split_oversized(segment: str, max_tokens: int) -> Iterator[str]:
+    if estimate_tokens(segment) <= max_tokens:
+        yield segment
+        return
+    # Prefer line boundaries, and fall back to hard cuts for very long lines
+    max_chars = max_tokens * 4
+    buffer = ""
+    for line in segment.splitlines(keepends=True):
+        while len(line) > max_chars:
+            if buffer:
+                yield buffer
+                buffer = ""
+            yield line[:max_chars]
+            line = line[max_chars:]
+        if len(buffer) + len(line) > max_chars:
+            yield buffer
+            buffer = ""
+        buffer += line
+    if buffer:
+        yield buffer
@@ -1,10 +1,30 @@
+import atexit
+import copy
 import json
 import os
-from typing import Dict, Optional
+import shutil
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+SAVE_DELAY = 0.5  # seconds; changes made within this window are written together
 
 class ConfigManager:
-    def __init__(self):
+    """
+    Settings stored in sag_ine_config.json. Setters only mark the config as changed;
+    a background timer writes it after SAVE_DELAY, so bursts of changes cost one write.
+    Writes go to a temporary file that replaces the config, so a crash never leaves a
+    half-written file, and pending changes are flushed on shutdown.
+    """
+    def __init__(self, save_delay: float = SAVE_DELAY):
         self.config_file = "sag_ine_config.json"
+        self.save_delay = save_delay
+        self.load_error = None  # set when the config file could not be read
+        self._lock = threading.RLock()
+        # Held for a whole write, so a slow disk never blocks the setters that take _lock
+        self._write_lock = threading.Lock()
+        self._dirty = False
+        self._save_timer = None
         self.default_config = {
             "ai_provider": "none",  # none, ollama, openai, gemini
             "api_keys": {
@@ -14,61 +34,158 @@ class ConfigManager:
             "ollama": {
                 "host": "http://localhost",
                 "port": "11434",
-                "model": "llama3"
+                "model": "llama3",
+                "pool_size": 4,  # kept-alive connections to the server
+                "http_retries": 2,  # retries of failed connects and 502/503/504 answers
+                "keep_alive": "30m"  # how long the server keeps the model loaded
+            },
+            "concurrency": {
+                "none": 4,
+                "ollama": 1,
+                "openai": 4,
+                "gemini": 2
             },
+            "timeouts": {  # [connect, read] in seconds
+                "ollama": [5, 300],
+                "openai": [5, 60],
+                "gemini": [5, 60]
+            },
+            "semantic_search": False,
+            "context_tokens": 3000,
+            "pdf_workers": 0,  # processes for extracting large PDFs; 0 or 1 reads them in this process
             "theme": "dark",
             "recent_files": []
         }
         self.config = self.load_config()
+        atexit.register(self.flush)
 
     def load_config(self) -> Dict:
         if os.path.exists(self.config_file):
             try:
                 with open(self.config_file, 'r') as f:
                     return json.load(f)
-            except:
-                return self.default_config.copy()
-        return self.default_config.copy()
+            except Exception as e:
+                # Keep the unreadable file for inspection instead of overwriting it with defaults later
+                backup = f"{self.config_file}.corrupt-{time.strftime('%Y%m%d-%H%M%S')}"
+                try:
+                    shutil.copy2(self.config_file, backup)
+                    self.load_error = f"Could not read {self.config_file} ({e}). It was backed up to {backup} and defaults are used."
+                except OSError as copy_error:
+                    self.load_error = f"Could not read {self.config_file} ({e}) or back it up ({copy_error}). Defaults are used."
+                print(self.load_error)
+                return copy.deepcopy(self.default_config)
+        return copy.deepcopy(self.default_config)
 
     def save_config(self):
-        with open(self.config_file, 'w') as f:
-            json.dump(self.config, f, indent=4)
+        """Schedules a write of the current settings"""
+        with self._lock:
+            self._dirty = True
+            if self._save_timer is None:
+                self._save_timer = threading.Timer(self.save_delay, self.flush)
+                self._save_timer.daemon = True
+                self._save_timer.start()
+
+    def flush(self):
+        """Writes pending changes right away; called on shutdown"""
+        # Writes run one at a time, so an older snapshot never replaces a newer one
+        with self._write_lock:
+            with self._lock:
+                if self._save_timer is not None:
+                    self._save_timer.cancel()
+                    self._save_timer = None
+                if not self._dirty:
+                    return
+                snapshot = copy.deepcopy(self.config)
+                self._dirty = False
+            temp_path = f"{self.config_file}.tmp"
+            try:
+                with open(temp_path, 'w') as f:
+                    json.dump(snapshot, f, indent=4)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(temp_path, self.config_file)
+            except OSError as e:
+                print(f"Could not save settings: {e}")
+                with self._lock:
+                    self._dirty = True
 
     def get_ai_provider(self) -> str:
         return self.config.get("ai_provider", "none")
 
     def set_ai_provider(self, provider: str):
-        self.config["ai_provider"] = provider
-        self.save_config()
+        with self._lock:
+            self.config["ai_provider"] = provider
+            self.save_config()
 
     def get_api_key(self, provider: str) -> str:
         return self.config.get("api_keys", {}).get(provider, "")
 
     def set_api_key(self, provider: str, key: str):
-        if "api_keys" not in self.config:
-            self.config["api_keys"] = {}
-        self.config["api_keys"][provider] = key
-        self.save_config()
+        with self._lock:
+            if "api_keys" not in self.config:
+                self.config["api_keys"] = {}
+            self.config["api_keys"][provider] = key
+            self.save_config()
 
     def get_ollama_settings(self) -> Dict:
-        return self.config.get("ollama", self.default_config["ollama"])
+        # Configs saved before a setting existed get its default
+        return dict(self.default_config["ollama"], **self.config.get("ollama", {}))
 
     def set_ollama_settings(self, host: str, port: str, model: str):
-        self.config["ollama"] = {
-            "host": host,
-            "port": port,
-            "model": model
-        }
-        self.save_config()
+        with self._lock:
+            self.config["ollama"] = dict(self.config.get("ollama", {}), host=host, port=port, model=model)
+            self.save_config()
+
+    def get_provider_settings(self, provider: str) -> Dict:
+        """Constructor arguments for the given provider, as used by ai_providers.create_provider"""
+        if provider == "ollama":
+            settings = self.get_ollama_settings()
+            return {
+                key: settings[key]
+                for key in ("host", "port", "model", "pool_size", "http_retries", "keep_alive")
+            }
+        if provider in ("openai", "gemini"):
+            return {"api_key": self.get_api_key(provider)}
+        return {}
+
+    def get_concurrency(self, provider: str) -> int:
+        """Returns how many requests may run at once against the given provider"""
+        defaults = self.default_config["concurrency"]
+        return self.config.get("concurrency", defaults).get(provider, defaults.get(provider, 1))
+
+    def get_timeouts(self, provider: str) -> Tuple[float, float]:
+        """Returns the (connect, read) timeouts in seconds for requests to the given provider"""
+        defaults = self.default_config["timeouts"]
+        connect, read = self.config.get("timeouts", defaults).get(provider, defaults.get(provider, [5, 60]))
+        return connect, read
+
+    def get_context_tokens(self) -> int:
+        """Token budget for the conversation history sent with each chat request"""
+        return self.config.get("context_tokens", self.default_config["context_tokens"])
+
+    def get_pdf_workers(self) -> int:
+        """Processes used to extract large PDFs in parallel, at most one per CPU"""
+        workers = int(self.config.get("pdf_workers", self.default_config["pdf_workers"]) or 0)
+        return max(0, min(workers, os.cpu_count() or 1))
+
+    def get_semantic_search(self) -> bool:
+        return self.config.get("semantic_search", False)
+
+    def set_semantic_search(self, enabled: bool):
+        with self._lock:
+            self.config["semantic_search"] = enabled
+            self.save_config()
 
     def add_recent_file(self, file_path: str):
-        if "recent_files" not in self.config:
-            self.config["recent_files"] = []
-        if file_path in self.config["recent_files"]:
-            self.config["recent_files"].remove(file_path)
-        self.config["recent_files"].insert(0, file_path)
-        self.config["recent_files"] = self.config["recent_files"][:10]  # Keep only last 10 files
-        self.save_config()
+        with self._lock:
+            if "recent_files" not in self.config:
+                self.config["recent_files"] = []
+            if file_path in self.config["recent_files"]:
+                self.config["recent_files"].remove(file_path)
+            self.config["recent_files"].insert(0, file_path)
+            self.config["recent_files"] = self.config["recent_files"][:10]  # Keep only last 10 files
+            self.save_config()
 
     def get_recent_files(self) -> list:
-        return self.config.get("recent_files", [])
+        with self._lock:
+            return list(self.config.get("recent_files", []))
@@ -0,0 +1,91 @@
+import hashlib
+import threading
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+from chunking import estimate_tokens
+
+@dataclass
+class Message:
+    role: str  # "user" or "assistant"
+    content: str
+    tokens: int
+
+class Conversation:
+    """
+    Message history for one chat. Each request is built within a token budget:
+    the newest turns are sent verbatim, and older turns are folded into a running
+    summary (or simply dropped when no summarizer is available). Summaries are
+    extended incrementally and cached, so each turn is summarized at most once.
+    """
+    def __init__(self, max_tokens: int = 3000, summary_tokens: int = 500):
+        self.max_tokens = max_tokens
+        self.summary_tokens = summary_tokens
+        self.messages: List[Message] = []
+        self.summary = ""
+        self._summarized = 0  # messages before this index are covered by the summary
+        self._summary_cache: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def add(self, role: str, content: str):
+        with self._lock:
+            self.messages.append(Message(role, content, estimate_tokens(content)))
+
+    def add_exchange(self, question: str, answer: str):
+        """Records a question together with its answer, so a turn never lacks its reply"""
+        with self._lock:
+            self.messages.append(Message("user", question, estimate_tokens(question)))
+            self.messages.append(Message("assistant", answer, estimate_tokens(answer)))
+
+    def build_prompt(self, new_input: str, summarizer: Optional[Callable[[str], str]] = None) -> str:
+        with self._lock:
+            messages = list(self.messages)
+            summarized = self._summarized
+            summary = self.summary
+
+        # Keep as many recent messages as fit next to the new input and the summary
+        budget = self.max_tokens - estimate_tokens(new_input) - self.summary_tokens
+        cut = len(messages)
+        while cut > summarized and budget - messages[cut - 1].tokens >= 0:
+            budget -= messages[cut - 1].tokens
+            cut -= 1
+
+        if cut > summarized:
+            dropped = messages[summarized:cut]
+            if summarizer is not None:
+                summary = self._extend_summary(summary, dropped, summarizer)
+            with self._lock:
+                # Another request may have advanced the summary meanwhile; keep the newest
+                if cut > self._summarized:
+                    self.summary = summary
+                    self._summarized = cut
+
+        parts = []
+        if summary:
+            parts.append(f"Summary of the earlier conversation:\n{summary}")
+        parts.extend(f"{self._label(message.role)}: {message.content}" for message in messages[cut:])
+        if not parts:
+            return new_input
+        parts.append(f"User: {new_input}")
+        parts.append("Assistant:")
+        return '\n\n'.join(parts)
+
+    def _extend_summary(self, summary: str, messages: List[Message], summarizer: Callable[[str], str]) -> str:
+        transcript = '\n'.join(f"{self._label(message.role)}: {message.content}" for message in messages)
+        key = hashlib.sha256(f"{summary}\0{transcript}".encode('utf-8')).hexdigest()
+        cached = self._summary_cache.get(key)
+        if cached is not None:
+            return cached
+        prompt = (
+            f"Update the summary of a conversation with the new messages below. "
+            f"Keep facts, names, decisions and open questions; stay under {self.summary_tokens * 3 // 4} words.\n\n"
+            f"Current summary:\n{summary or '(none)'}\n\nNew messages:\n{transcript}\n\nUpdated summary:"
+        )
+        updated = summarizer(prompt).strip()
+        if estimate_tokens(updated) > self.summary_tokens:
+            updated = updated[:self.summary_tokens * 4]
+        self._summary_cache[key] = updated
+        return updated
+
+    @staticmethod
+    def _label(role: str) -> str:
+        return "User" if role == "user" else "Assistant"
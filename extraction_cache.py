@@ -0,0 +1,92 @@
+import hashlib
+import json
+import os
+import threading
+from typing import Any, Optional
+
+# Bump when the text produced for a file type changes, so stale entries are ignored
+EXTRACTION_VERSION = 2
+
+class ExtractionCache:
+    """
+    On-disk cache of text extracted from documents. Entries are keyed by the file's
+    path, size, modification time and a hash of its first and last blocks, so
+    re-opening an unchanged file skips parsing entirely. The least recently used
+    entries are removed once the cache grows beyond max_bytes.
+    """
+    SAMPLE_BYTES = 64 * 1024
+
+    def __init__(self, cache_dir: str = "sag_ine_extract_cache", max_bytes: int = 200 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._total_bytes = sum(entry.stat().st_size for entry in os.scandir(cache_dir) if entry.is_file())
+
+    def fingerprint(self, file_path: str, kind: str) -> str:
+        stat = os.stat(file_path)
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(f"{EXTRACTION_VERSION}\0{kind}\0{os.path.abspath(file_path)}\0{stat.st_size}\0{stat.st_mtime_ns}".encode('utf-8'))
+        with open(file_path, 'rb') as file:
+            digest.update(file.read(self.SAMPLE_BYTES))
+            if stat.st_size > self.SAMPLE_BYTES:
+                file.seek(max(self.SAMPLE_BYTES, stat.st_size - self.SAMPLE_BYTES))
+                digest.update(file.read(self.SAMPLE_BYTES))
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        path = self._entry_path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as file:
+                value = json.load(file)
+            os.utime(path)  # Mark as recently used
+            return value
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key: str, value: Any):
+        data = json.dumps(value).encode('utf-8')
+        if len(data) > self.max_bytes:
+            return
+        path = self._entry_path(key)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with self._lock:
+            try:
+                previous = os.path.getsize(path) if os.path.exists(path) else 0
+                with open(temp_path, 'wb') as file:
+                    file.write(data)
+                os.replace(temp_path, path)
+            except OSError:
+                return
+            self._total_bytes += len(data) - previous
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _evict(self):
+        entries = sorted(
+            (entry for entry in os.scandir(self.cache_dir) if entry.is_file()),
+            key=lambda entry: entry.stat().st_mtime
+        )
+        for entry in entries:
+            if self._total_bytes <= self.max_bytes:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+                self._total_bytes -= size
+            except OSError:
+                continue
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+def get_extraction_cache() -> ExtractionCache:
+    """Returns the process-wide cache of extracted document text"""
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = ExtractionCache()
+        return _shared_cache
@@ -1,13 +1,40 @@
-import docx
-import pandas as pd
-import PyPDF2
-from io import StringIO
 import os
+import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import TYPE_CHECKING, Iterator, List, Optional
+from extraction_cache import get_extraction_cache
+
+# The format libraries are slow to import, so each is loaded the first time a file needs it
+if TYPE_CHECKING:
+    import pandas as pd
+
+def _extract_pdf_range(file_path: str, start: int, end: int) -> List[str]:
+    import PyPDF2
+    # Runs in a worker process, so it opens its own reader
+    with open(file_path, 'rb') as file:
+        pdf_reader = PyPDF2.PdfReader(file)
+        return [pdf_reader.pages[i].extract_text() for i in range(start, end)]
 
 class FileHandler:
+    SPREADSHEET_CHUNK_ROWS = 50000
+    PDF_PAGES_PER_TASK = 16
+
     @staticmethod
     def read_file(file_path: str) -> tuple[str, str]:
         """Returns tuple of (file_content, file_type)"""
+        cache = get_extraction_cache()
+        key = cache.fingerprint(file_path, 'text')
+        cached = cache.get(key)
+        if cached:
+            return cached['content'], cached['file_type']
+        
+        content, file_type = FileHandler._extract_file(file_path)
+        cache.put(key, {'content': content, 'file_type': file_type})
+        return content, file_type
+
+    @staticmethod
+    def _extract_file(file_path: str) -> tuple[str, str]:
         ext = os.path.splitext(file_path)[1].lower()
         
         if ext == '.txt':
@@ -21,36 +48,160 @@ class FileHandler:
         else:
             raise ValueError(f"Unsupported file type: {ext}")
 
+    @staticmethod
+    def read_segments(file_path: str, workers: int = 0) -> tuple[Iterator[str], str]:
+        """
+        Returns tuple of (segments, file_type) where segments yields the file in its
+        natural units: paragraphs for text and Word files, pages for PDFs and the
+        schema, statistics and sampled rows for spreadsheets. With workers > 1, PDF pages
+        are extracted in a process pool.
+        """
+        cache = get_extraction_cache()
+        key = cache.fingerprint(file_path, 'segments')
+        cached = cache.get(key)
+        if cached:
+            return iter(cached['segments']), cached['file_type']
+        
+        segments, file_type = FileHandler._extract_segments(file_path, workers)
+        return FileHandler._cache_segments(segments, file_type, key), file_type
+
+    @staticmethod
+    def _cache_segments(segments: Iterator[str], file_type: str, key: str) -> Iterator[str]:
+        # Segments pass straight through; they are only stored once the file was read to the end
+        collected = []
+        for segment in segments:
+            collected.append(segment)
+            yield segment
+        get_extraction_cache().put(key, {'segments': collected, 'file_type': file_type})
+
+    @staticmethod
+    def _extract_segments(file_path: str, workers: int) -> tuple[Iterator[str], str]:
+        ext = os.path.splitext(file_path)[1].lower()
+
+        if ext == '.txt':
+            return FileHandler._iter_txt_paragraphs(file_path), 'text'
+        elif ext == '.docx':
+            return FileHandler._iter_docx_paragraphs(file_path), 'docx'
+        elif ext == '.pdf':
+            return FileHandler.iter_pdf_pages(file_path, workers), 'pdf'
+        elif ext in ['.csv', '.xlsx', '.xls']:
+            return FileHandler._iter_spreadsheet_rows(file_path), 'spreadsheet'
+        else:
+            raise ValueError(f"Unsupported file type: {ext}")
+
     @staticmethod
     def _read_txt(file_path: str) -> str:
         with open(file_path, 'r', encoding='utf-8') as file:
             return file.read()
 
+    @staticmethod
+    def _iter_txt_paragraphs(file_path: str) -> Iterator[str]:
+        return iter(re.split(r'\n\s*\n', FileHandler._read_txt(file_path)))
+
     @staticmethod
     def _read_docx(file_path: str) -> str:
+        return '\n'.join(FileHandler._iter_docx_paragraphs(file_path))
+
+    @staticmethod
+    def _iter_docx_paragraphs(file_path: str) -> Iterator[str]:
+        import docx
         doc = docx.Document(file_path)
-        return '\n'.join([paragraph.text for paragraph in doc.paragraphs])
+        for paragraph in doc.paragraphs:
+            yield paragraph.text
 
     @staticmethod
     def _read_pdf(file_path: str) -> str:
-        text = []
+        return '\n'.join(FileHandler.iter_pdf_pages(file_path))
+
+    @staticmethod
+    def iter_pdf_pages(file_path: str, workers: int = 0) -> Iterator[str]:
+        """
+        Yields page texts in order as soon as each is extracted. With workers > 1,
+        ranges of pages are extracted in parallel processes; only a few ranges are
+        in flight at a time so memory stays bounded on very long documents.
+        """
+        import PyPDF2
         with open(file_path, 'rb') as file:
             pdf_reader = PyPDF2.PdfReader(file)
-            for page in pdf_reader.pages:
-                text.append(page.extract_text())
-        return '\n'.join(text)
+            page_count = len(pdf_reader.pages)
+            if workers <= 1 or page_count <= FileHandler.PDF_PAGES_PER_TASK:
+                for page in pdf_reader.pages:
+                    yield page.extract_text()
+                return
+
+        step = FileHandler.PDF_PAGES_PER_TASK
+        ranges = iter(range(0, page_count, step))
+        executor = ProcessPoolExecutor(max_workers=workers)
+        in_flight = deque()
+        try:
+            for start in ranges:
+                in_flight.append(executor.submit(_extract_pdf_range, file_path, start, min(start + step, page_count)))
+                if len(in_flight) >= workers * 2:
+                    yield from in_flight.popleft().result()
+            while in_flight:
+                yield from in_flight.popleft().result()
+        finally:
+            # Also reached when the consumer stops early; drop work that has not started
+            executor.shutdown(wait=False, cancel_futures=True)
 
     @staticmethod
     def _read_spreadsheet(file_path: str) -> str:
-        if file_path.endswith('.csv'):
-            df = pd.read_csv(file_path)
+        return '\n\n'.join(FileHandler.summarize_spreadsheet(file_path))
+
+    @staticmethod
+    def _iter_spreadsheet_rows(file_path: str) -> Iterator[str]:
+        return iter(FileHandler.summarize_spreadsheet(file_path))
+
+    @staticmethod
+    def summarize_spreadsheet(file_path: str, columns: Optional[List[str]] = None,
+                              sample_rows: int = 50) -> List[str]:
+        """
+        Streams the spreadsheet in chunks and returns its compact description as
+        segments: schema with per-column statistics, then sampled rows (all rows
+        for small sheets). columns restricts reading to the given columns.
+        """
+        from spreadsheet_summary import SpreadsheetSummary
+        summary = SpreadsheetSummary(sample_rows=sample_rows)
+        for chunk in FileHandler._iter_spreadsheet_chunks(file_path, columns):
+            summary.update(chunk)
+        return summary.render(os.path.basename(file_path))
+
+    @staticmethod
+    def _iter_spreadsheet_chunks(file_path: str, columns: Optional[List[str]] = None) -> Iterator['pd.DataFrame']:
+        import pandas as pd
+        chunk_rows = FileHandler.SPREADSHEET_CHUNK_ROWS
+        if file_path.lower().endswith('.csv'):
+            yield from pd.read_csv(file_path, usecols=columns, chunksize=chunk_rows)
+        elif file_path.lower().endswith('.xlsx'):
+            yield from FileHandler._iter_xlsx_chunks(file_path, columns, chunk_rows)
         else:
-            df = pd.read_excel(file_path)
-        
-        # Convert DataFrame to string representation
-        buffer = StringIO()
-        df.to_string(buffer)
-        return buffer.getvalue()
+            # The legacy .xls reader cannot stream, so only the projection saves memory here
+            yield pd.read_excel(file_path, usecols=columns)
+
+    @staticmethod
+    def _iter_xlsx_chunks(file_path: str, columns: Optional[List[str]], chunk_rows: int) -> Iterator['pd.DataFrame']:
+        import openpyxl
+        import pandas as pd
+        workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                return
+            header = [str(name) if name is not None else f"Unnamed: {i}" for i, name in enumerate(header)]
+            keep = [i for i, name in enumerate(header) if columns is None or name in columns]
+            names = [header[i] for i in keep]
+            batch = []
+            for row in rows:
+                batch.append([row[i] if i < len(row) else None for i in keep])
+                if len(batch) >= chunk_rows:
+                    # Let pandas infer column types the same way read_csv would
+                    yield pd.DataFrame(batch, columns=names).infer_objects()
+                    batch = []
+            if batch:
+                yield pd.DataFrame(batch, columns=names).infer_objects()
+        finally:
+            workbook.close()
 
     @staticmethod
     def get_supported_extensions() -> list:
@@ -0,0 +1,130 @@
+import os
+import sqlite3
+import threading
+from typing import Iterable, List, Optional, Tuple
+from chunking import chunk_segments, estimate_tokens, tokenize
+from file_handlers import FileHandler
+
+PASSAGE_TOKENS = 250
+CONTEXT_TOKENS = 2000
+
+class FileIndex:
+    """
+    Incremental full-text index (SQLite FTS5) over passages of analyzed files.
+    Files are only re-read when their size or modification time changed, and
+    questions retrieve the top-ranked passages instead of whole documents.
+    """
+    def __init__(self, db_path: str = "sag_ine_index.db", passage_tokens: int = PASSAGE_TOKENS):
+        self.passage_tokens = passage_tokens
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime REAL NOT NULL,
+                file_type TEXT NOT NULL
+            )
+        """)
+        self._conn.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS passages USING fts5(path UNINDEXED, position UNINDEXED, text)"
+        )
+        self._conn.commit()
+
+    def update(self, paths: Iterable[str]) -> int:
+        """Indexes new or changed files and drops missing ones; returns how many were (re)indexed"""
+        indexed = 0
+        for path in paths:
+            path = os.path.abspath(path)
+            if not os.path.exists(path):
+                self.remove(path)
+                continue
+            stat = os.stat(path)
+            with self._lock:
+                row = self._conn.execute("SELECT size, mtime FROM files WHERE path = ?", (path,)).fetchone()
+            if row and row[0] == stat.st_size and row[1] == stat.st_mtime:
+                continue
+            try:
+                segments, file_type = FileHandler.read_segments(path)
+                passages = list(chunk_segments(segments, self.passage_tokens))
+            except Exception as e:
+                print(f"Could not index {path}: {e}")
+                continue
+            with self._lock:
+                self._conn.execute("DELETE FROM passages WHERE path = ?", (path,))
+                self._conn.executemany(
+                    "INSERT INTO passages (path, position, text) VALUES (?, ?, ?)",
+                    [(path, position, passage) for position, passage in enumerate(passages)]
+                )
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)",
+                    (path, stat.st_size, stat.st_mtime, file_type)
+                )
+                self._conn.commit()
+            indexed += 1
+        return indexed
+
+    def remove(self, path: str):
+        path = os.path.abspath(path)
+        with self._lock:
+            self._conn.execute("DELETE FROM passages WHERE path = ?", (path,))
+            self._conn.execute("DELETE FROM files WHERE path = ?", (path,))
+            self._conn.commit()
+
+    def search(self, query: str, k: int = 5, paths: Optional[Iterable[str]] = None) -> List[Tuple[str, str]]:
+        """Returns up to k (path, passage) pairs ranked by BM25, optionally limited to some files"""
+        terms = sorted(set(tokenize(query)))
+        if not terms:
+            return []
+        # Quote every term so user input can never be parsed as FTS syntax
+        match = ' OR '.join('"' + term.replace('"', '""') + '"' for term in terms)
+        sql = "SELECT path, text FROM passages WHERE passages MATCH ?"
+        params = [match]
+        if paths is not None:
+            paths = [os.path.abspath(path) for path in paths]
+            if not paths:
+                return []
+            sql += f" AND path IN ({', '.join('?' * len(paths))})"
+            params.extend(paths)
+        sql += " ORDER BY bm25(passages) LIMIT ?"
+        params.append(k)
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def passages(self, path: str) -> List[str]:
+        """Returns the indexed passages of one file in document order"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT text FROM passages WHERE path = ? ORDER BY position", (os.path.abspath(path),)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def build_prompt(self, question: str, paths: Optional[Iterable[str]] = None,
+                     max_tokens: int = CONTEXT_TOKENS,
+                     extra_passages: Optional[List[Tuple[str, str]]] = None) -> str:
+        """
+        Builds a prompt answering the question from the best matching passages only.
+        extra_passages (e.g. from semantic search) are ranked ahead of keyword matches.
+        """
+        candidates = list(extra_passages or [])
+        candidates += self.search(question, k=max(1, max_tokens // self.passage_tokens) * 2, paths=paths)
+        passages = []
+        seen = set()
+        used_tokens = 0
+        for path, text in candidates:
+            if text in seen:
+                continue
+            tokens = estimate_tokens(text)
+            if used_tokens + tokens > max_tokens:
+                break
+            seen.add(text)
+            passages.append(f"[{os.path.basename(path)}]\n{text}")
+            used_tokens += tokens
+        if not passages:
+            return question
+        context = '\n\n'.join(passages)
+        return (
+            "Answer the question using these excerpts from the user's files. "
+            "Mention which file the answer comes from.\n\n"
+            f"{context}\n\nQuestion: {question}"
+        )
@@ -0,0 +1,388 @@
+import sqlite3
+import threading
+import time
+from email.utils import formatdate
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+METADATA_HEADERS = ['Subject', 'From', 'Date']
+BATCH_SIZE = 50  # Gmail recommends at most 50 requests per batch
+INITIAL_MESSAGES = 200
+PAGE_SIZE = 30
+
+def _http_status(error: Exception) -> Optional[int]:
+    # googleapiclient's HttpError carries the response as error.resp
+    status = getattr(getattr(error, 'resp', None), 'status', None)
+    return int(status) if status is not None else None
+
+class MessageStore:
+    """
+    Local SQLite copy of the message headers in one label, plus the Gmail
+    history ID they are current with. Pages are read newest first.
+    """
+    def __init__(self, db_path: str = "sag_ine_mail.db"):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS messages (
+                id TEXT PRIMARY KEY,
+                thread_id TEXT,
+                subject TEXT,
+                sender TEXT,
+                date TEXT,
+                internal_date INTEGER NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS messages_by_date ON messages (internal_date DESC)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT)")
+        self._conn.commit()
+
+    def has_older(self) -> bool:
+        """Whether the server has older messages than the ones stored"""
+        return bool(self.get_state("next_page_token"))
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+
+    def page(self, offset: int, limit: int = PAGE_SIZE) -> List[Dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, thread_id, subject, sender, date FROM messages "
+                "ORDER BY internal_date DESC, id LIMIT ? OFFSET ?",
+                (limit, offset)
+            ).fetchall()
+        return [
+            {'id': row[0], 'thread_id': row[1], 'subject': row[2], 'from': row[3], 'date': row[4]}
+            for row in rows
+        ]
+
+    def get_state(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def replace_all(self, messages: List[Dict], history_id: str, next_page_token: Optional[str]):
+        with self._lock:
+            self._conn.execute("DELETE FROM messages")
+            self._write(messages, (), {"history_id": history_id, "next_page_token": next_page_token or ""})
+
+    def apply(self, messages: List[Dict], removed: Iterable[str], history_id: str):
+        """Stores new or changed headers and drops removed ones, together with the history ID they lead to"""
+        with self._lock:
+            self._write(messages, removed, {"history_id": history_id})
+
+    def add_older(self, messages: List[Dict], next_page_token: Optional[str]):
+        """Stores headers of older messages fetched while paging back through the label"""
+        with self._lock:
+            self._write(messages, (), {"next_page_token": next_page_token or ""})
+
+    def _write(self, messages: List[Dict], removed: Iterable[str], state: Dict[str, str]):
+        # One transaction, so the stored state never runs ahead of the stored headers
+        self._conn.executemany("DELETE FROM messages WHERE id = ?", [(message_id,) for message_id in removed])
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO messages VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (message['id'], message['thread_id'], message['subject'], message['from'],
+                 message['date'], message['internal_date'])
+                for message in messages
+            ]
+        )
+        state = dict(state, synced_at=time.time())
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO state VALUES (?, ?)",
+            [(key, str(value)) for key, value in state.items()]
+        )
+        self._conn.commit()
+
+class GmailSync:
+    """
+    Keeps a MessageStore in step with one Gmail label. The first sync lists the
+    newest messages; later syncs only ask for the history since the stored
+    history ID and fetch headers for the messages that arrived, so the traffic
+    follows the number of changes rather than the size of the mailbox.
+    """
+    def __init__(self, service, store: MessageStore, label: str = 'INBOX',
+                 initial_messages: int = INITIAL_MESSAGES):
+        self.service = service
+        self.store = store
+        self.label = label
+        self.initial_messages = initial_messages
+
+    def sync(self) -> Tuple[int, int]:
+        """Returns (messages stored or updated, messages removed)"""
+        history_id = self.store.get_state("history_id")
+        if history_id is not None:
+            try:
+                return self._partial_sync(history_id)
+            except Exception as e:
+                # Gmail only keeps history for a limited time; an expired ID means starting over
+                if _http_status(e) != 404:
+                    raise
+        return self._full_sync()
+
+    def _full_sync(self) -> Tuple[int, int]:
+        users = self.service.users()
+        # Taken before listing, so changes made meanwhile are picked up by the next sync
+        history_id = users.getProfile(userId='me').execute()['historyId']
+        ids = []
+        page_token = None
+        while len(ids) < self.initial_messages:
+            response = users.messages().list(
+                userId='me',
+                labelIds=[self.label],
+                maxResults=min(500, self.initial_messages - len(ids)),
+                pageToken=page_token
+            ).execute()
+            ids.extend(message['id'] for message in response.get('messages', []))
+            page_token = response.get('nextPageToken')
+            if not page_token:
+                break
+        messages = self._fetch_headers(ids)
+        self.store.replace_all(messages, history_id, page_token)
+        return len(messages), 0
+
+    def load_older(self, count: int = PAGE_SIZE) -> int:
+        """Fetches the next page of older messages than the stored ones; returns how many were stored"""
+        page_token = self.store.get_state("next_page_token")
+        if not page_token:
+            return 0
+        response = self.service.users().messages().list(
+            userId='me',
+            labelIds=[self.label],
+            maxResults=count,
+            pageToken=page_token
+        ).execute()
+        messages = self._fetch_headers([message['id'] for message in response.get('messages', [])])
+        self.store.add_older(messages, response.get('nextPageToken'))
+        return len(messages)
+
+    def _partial_sync(self, start_history_id: str) -> Tuple[int, int]:
+        history = self.service.users().history()
+        added: Set[str] = set()
+        removed: Set[str] = set()
+        page_token = None
+        while True:
+            response = history.list(
+                userId='me',
+                startHistoryId=start_history_id,
+                labelId=self.label,
+                pageToken=page_token
+            ).execute()
+            # Records are in order, so a later change to the same message wins
+            for record in response.get('history', []):
+                for item in record.get('messagesAdded', []):
+                    if self.label in item['message'].get('labelIds', []):
+                        self._mark(item['message']['id'], added, removed)
+                for item in record.get('labelsAdded', []):
+                    if self.label in item.get('labelIds', []):
+                        self._mark(item['message']['id'], added, removed)
+                for item in record.get('labelsRemoved', []):
+                    if self.label in item.get('labelIds', []):
+                        self._mark(item['message']['id'], removed, added)
+                for item in record.get('messagesDeleted', []):
+                    self._mark(item['message']['id'], removed, added)
+            page_token = response.get('nextPageToken')
+            if not page_token:
+                break
+        messages = self._fetch_headers(sorted(added))
+        self.store.apply(messages, removed, response['historyId'])
+        return len(messages), len(removed)
+
+    @staticmethod
+    def _mark(message_id: str, into: Set[str], out_of: Set[str]):
+        into.add(message_id)
+        out_of.discard(message_id)
+
+    def _fetch_headers(self, ids: List[str]) -> List[Dict]:
+        """Fetches the headers of the given messages, in batched requests"""
+        messages = []
+        errors = []
+
+        def on_response(request_id, response, exception):
+            if exception is not None:
+                # Deleted since it was listed; the next sync reports the deletion
+                if _http_status(exception) != 404:
+                    errors.append(exception)
+                return
+            headers = {header['name'].lower(): header['value'] for header in response['payload'].get('headers', [])}
+            messages.append({
+                'id': response['id'],
+                'thread_id': response.get('threadId'),
+                'subject': headers.get('subject', 'No Subject'),
+                'from': headers.get('from', 'Unknown Sender'),
+                'date': headers.get('date', 'No Date'),
+                'internal_date': int(response.get('internalDate', 0))
+            })
+
+        api = self.service.users().messages()
+        for start in range(0, len(ids), BATCH_SIZE):
+            batch = self.service.new_batch_http_request(callback=on_response)
+            for message_id in ids[start:start + BATCH_SIZE]:
+                batch.add(api.get(userId='me', id=message_id, format='metadata', metadataHeaders=METADATA_HEADERS))
+            batch.execute()
+            if errors:
+                raise errors[0]
+        return messages
+
+class FakeHttpError(Exception):
+    """Stands in for googleapiclient.errors.HttpError"""
+    def __init__(self, status: int, message: str = ""):
+        super().__init__(message or f"HTTP {status}")
+        self.resp = type("Response", (), {"status": status})()
+
+class _FakeRequest:
+    def __init__(self, service, handler, *args):
+        self._service = service
+        self._handler = handler
+        self._args = args
+
+    def execute(self):
+        self._service.request_count += 1
+        return self._handler(*self._args)
+
+class _FakeBatch:
+    def __init__(self, service, callback):
+        self._service = service
+        self._callback = callback
+        self._requests = []
+
+    def add(self, request, callback=None, request_id=None):
+        self._requests.append((request, callback or self._callback, request_id or str(len(self._requests))))
+
+    def execute(self):
+        for request, callback, request_id in self._requests:
+            try:
+                response = request._handler(*request._args)
+            except Exception as e:
+                callback(request_id, None, e)
+            else:
+                callback(request_id, response, None)
+
+class _FakeResource:
+    def __init__(self, **methods):
+        self.__dict__.update(methods)
+
+class FakeGmailService:
+    """
+    In-process Gmail API with the same call shapes as the googleapiclient
+    resource (users().messages().list/get, users().history().list,
+    users().getProfile and batch requests), for running GmailSync without a
+    network or an account. Mailbox changes are made with add_message,
+    delete_message and set_labels; request_count counts API calls.
+    """
+    def __init__(self, history_limit: int = 1000):
+        self.history_limit = history_limit
+        self.request_count = 0
+        self._messages: Dict[str, Dict] = {}
+        self._history: List[Dict] = []
+        self._history_id = 1
+        self._next_id = 1
+
+    # Mailbox changes
+
+    def add_message(self, subject: str, sender: str, labels: Iterable[str] = ('INBOX',)) -> str:
+        message_id = f"{self._next_id:016x}"
+        self._next_id += 1
+        internal_date = int(time.time() * 1000) + self._next_id
+        self._messages[message_id] = {
+            'id': message_id,
+            'threadId': message_id,
+            'labelIds': list(labels),
+            'internalDate': str(internal_date),
+            'payload': {'headers': [
+                {'name': 'Subject', 'value': subject},
+                {'name': 'From', 'value': sender},
+                {'name': 'Date', 'value': formatdate(internal_date / 1000, localtime=True)}
+            ]}
+        }
+        self._record('messagesAdded', message_id, list(labels))
+        return message_id
+
+    def delete_message(self, message_id: str):
+        message = self._messages.pop(message_id)
+        self._record('messagesDeleted', message_id, message['labelIds'])
+
+    def set_labels(self, message_id: str, add: Iterable[str] = (), remove: Iterable[str] = ()):
+        message = self._messages[message_id]
+        add = [label for label in add if label not in message['labelIds']]
+        remove = [label for label in remove if label in message['labelIds']]
+        message['labelIds'] = [label for label in message['labelIds'] if label not in remove] + add
+        if add:
+            self._record('labelsAdded', message_id, add)
+        if remove:
+            self._record('labelsRemoved', message_id, remove)
+
+    def expire_history(self):
+        """Drops all history, as Gmail does after about a week"""
+        self._history = []
+        self._history_id += 1
+
+    def _record(self, kind: str, message_id: str, labels: List[str]):
+        self._history_id += 1
+        message = {'id': message_id, 'threadId': message_id, 'labelIds': list(self._messages.get(message_id, {}).get('labelIds', labels))}
+        entry = {'message': message}
+        if kind in ('labelsAdded', 'labelsRemoved'):
+            entry['labelIds'] = labels
+        self._history.append({'id': str(self._history_id), kind: [entry], 'messages': [message]})
+        del self._history[:-self.history_limit]
+
+    # API surface
+
+    def users(self):
+        return _FakeResource(
+            getProfile=lambda userId: _FakeRequest(self, self._get_profile),
+            messages=lambda: _FakeResource(
+                list=lambda userId, labelIds=None, maxResults=100, pageToken=None:
+                    _FakeRequest(self, self._list_messages, labelIds, maxResults, pageToken),
+                get=lambda userId, id, format='full', metadataHeaders=None:
+                    _FakeRequest(self, self._get_message, id)
+            ),
+            history=lambda: _FakeResource(
+                list=lambda userId, startHistoryId, labelId=None, pageToken=None, maxResults=100, historyTypes=None:
+                    _FakeRequest(self, self._list_history, startHistoryId, labelId, pageToken, maxResults)
+            )
+        )
+
+    def new_batch_http_request(self, callback=None):
+        self.request_count += 1
+        return _FakeBatch(self, callback)
+
+    def _get_profile(self) -> Dict:
+        return {'emailAddress': 'me@example.com', 'historyId': str(self._history_id)}
+
+    def _list_messages(self, label_ids, max_results, page_token) -> Dict:
+        matching = [
+            message for message in sorted(self._messages.values(), key=lambda m: int(m['internalDate']), reverse=True)
+            if not label_ids or all(label in message['labelIds'] for label in label_ids)
+        ]
+        start = int(page_token or 0)
+        page = matching[start:start + max_results]
+        response = {'messages': [{'id': m['id'], 'threadId': m['threadId']} for m in page]}
+        if start + max_results < len(matching):
+            response['nextPageToken'] = str(start + max_results)
+        return response
+
+    def _get_message(self, message_id: str) -> Dict:
+        if message_id not in self._messages:
+            raise FakeHttpError(404, f"Message {message_id} not found")
+        return self._messages[message_id]
+
+    def _list_history(self, start_history_id, label_id, page_token, max_results) -> Dict:
+        start_history_id = int(start_history_id)
+        oldest = int(self._history[0]['id']) if self._history else self._history_id + 1
+        if start_history_id < oldest - 1:
+            raise FakeHttpError(404, "Requested history ID is too old")
+        records = [
+            record for record in self._history
+            if int(record['id']) > start_history_id
+            and (label_id is None or any(
+                label_id in entry.get('labelIds', []) or label_id in entry['message']['labelIds']
+                for key in ('messagesAdded', 'messagesDeleted', 'labelsAdded', 'labelsRemoved')
+                for entry in record.get(key, [])
+            ))
+        ]
+        start = int(page_token or 0)
+        response = {'history': records[start:start + max_results], 'historyId': str(self._history_id)}
+        if start + max_results < len(records):
+            response['nextPageToken'] = str(start + max_results)
+        return response
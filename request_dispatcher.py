@@ -0,0 +1,124 @@
+import queue
+import threading
+from collections import deque
+from typing import Callable, Dict, Hashable, Optional
+
+class RequestHandle:
+    """
+    Cancellation token for one request. Workers check it between steps, and
+    callbacks registered with on_cancel (e.g. closing an HTTP response) run as
+    soon as cancel is called, which also unblocks a worker stuck reading.
+    """
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks = []
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self):
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"Error while cancelling request: {e}")
+
+    def on_cancel(self, callback: Callable[[], None]):
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def remove_callback(self, callback: Callable[[], None]):
+        """Unregisters a callback once what it would stop has finished"""
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def wait(self, timeout: float) -> bool:
+        """Sleeps up to timeout seconds; returns True early if the request is cancelled"""
+        return self._event.wait(timeout)
+
+class RequestDispatcher:
+    """
+    Runs submitted tasks on a bounded pool of worker threads.
+    Tasks sharing a key (e.g. a conversation) run one at a time in submission order,
+    while tasks with different keys or no key run concurrently.
+    """
+    def __init__(self, max_workers: int = 2):
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._waiting: Dict[Hashable, deque] = {}
+        self._workers = []
+        self.max_workers = 0
+        self.resize(max_workers)
+
+    def submit(self, func: Callable, *args, key: Optional[Hashable] = None):
+        task = (func, args, key)
+        with self._lock:
+            if key is not None:
+                if key in self._waiting:
+                    # Another task for this key is queued or running; run after it
+                    self._waiting[key].append(task)
+                    return
+                self._waiting[key] = deque()
+        self._queue.put(task)
+
+    def resize(self, max_workers: int):
+        max_workers = max(1, int(max_workers))
+        with self._lock:
+            # Workers still waiting for an earlier stop marker count as running, and
+            # keep running if the pool has grown again before they pick it up
+            for _ in range(max_workers - len(self._workers)):
+                worker = threading.Thread(target=self._worker_loop, daemon=True)
+                worker.start()
+                self._workers.append(worker)
+            for _ in range(len(self._workers) - max_workers):
+                self._queue.put(None)
+            self.max_workers = max_workers
+
+    def pending_count(self) -> int:
+        with self._lock:
+            waiting = sum(len(tasks) for tasks in self._waiting.values())
+        return self._queue.qsize() + waiting
+
+    def shutdown(self):
+        with self._lock:
+            for _ in range(len(self._workers)):
+                self._queue.put(None)
+            self.max_workers = 0
+
+    def _worker_loop(self):
+        while True:
+            task = self._queue.get()
+            if task is None:
+                with self._lock:
+                    if len(self._workers) > self.max_workers:
+                        self._workers.remove(threading.current_thread())
+                        return
+                continue
+            func, args, key = task
+            try:
+                func(*args)
+            except Exception as e:
+                print(f"Unhandled error in request worker: {e}")
+            finally:
+                self._task_done(key)
+
+    def _task_done(self, key: Optional[Hashable]):
+        if key is None:
+            return
+        with self._lock:
+            waiting = self._waiting.get(key)
+            if waiting:
+                self._queue.put(waiting.popleft())
+            else:
+                self._waiting.pop(key, None)
@@ -0,0 +1,164 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+def _normalize(text: str) -> str:
+    # Only line endings and surrounding whitespace; indentation and layout inside
+    # a prompt (code, YAML, tables) can change the answer
+    return text.replace('\r\n', '\n').strip()
+
+@dataclass(frozen=True)
+class CacheKey:
+    """Everything that influences a response: who answered, with which settings, to what"""
+    provider: str
+    model: str
+    prompt: str
+    system_prompt: str = ""
+    params: Dict = field(default_factory=dict, hash=False)
+
+    def digest(self) -> str:
+        payload = json.dumps({
+            "provider": self.provider,
+            "model": self.model,
+            "prompt": _normalize(self.prompt),
+            "system_prompt": _normalize(self.system_prompt),
+            "params": self.params
+        }, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class ResponseCache:
+    """
+    Persistent response cache shared by all AI providers.
+    Entries expire after a TTL, and the least recently used ones are evicted
+    once the stored responses exceed the byte budget. Hot entries are also
+    kept in a small in-memory LRU in front of the database.
+    """
+    def __init__(self, db_path: str = "sag_ine_cache.db", ttl_seconds: int = 7 * 24 * 3600,
+                 max_bytes: int = 50 * 1024 * 1024, memory_entries: int = 256):
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.memory_entries = memory_entries
+        self._memory = OrderedDict()
+        # Access times of memory hits not yet written to the database; written before evicting
+        self._accessed: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                provider TEXT NOT NULL,
+                model TEXT NOT NULL,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_lru ON responses (last_access)")
+        self._conn.commit()
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def get(self, cache_key: CacheKey) -> Optional[str]:
+        key = cache_key.digest()
+        now = time.time()
+        with self._lock:
+            if key in self._memory:
+                response, created = self._memory[key]
+                if now - created <= self.ttl_seconds:
+                    self._memory.move_to_end(key)
+                    self._accessed[key] = now
+                    return response
+                del self._memory[key]
+            row = self._conn.execute(
+                "SELECT response, size, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            response, size, created = row
+            if now - created > self.ttl_seconds:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                self._total_bytes -= size
+                return None
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self._remember(key, response, created)
+            return response
+
+    def put(self, cache_key: CacheKey, response: str):
+        key = cache_key.digest()
+        size = len(response.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            if row:
+                self._total_bytes -= row[0]
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, cache_key.provider, cache_key.model, response, size, now, now)
+            )
+            self._total_bytes += size
+            self._accessed.pop(key, None)
+            self._write_access_times()
+            self._evict(now)
+            self._conn.commit()
+            self._remember(key, response, now)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._accessed.clear()
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+            self._total_bytes = 0
+
+    def _remember(self, key: str, response: str, created: float):
+        self._memory[key] = (response, created)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _write_access_times(self):
+        if self._accessed:
+            self._conn.executemany(
+                "UPDATE responses SET last_access = ? WHERE key = ?",
+                [(accessed, key) for key, accessed in self._accessed.items()]
+            )
+            self._accessed.clear()
+
+    def _evict(self, now: float):
+        cursor = self._conn.execute(
+            "DELETE FROM responses WHERE created < ?", (now - self.ttl_seconds,)
+        )
+        if cursor.rowcount:
+            self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if self._total_bytes <= self.max_bytes:
+            return
+        evicted = []
+        for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY last_access"):
+            evicted.append((key,))
+            self._total_bytes -= size
+            if self._total_bytes <= self.max_bytes:
+                break
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", evicted)
+        for (key,) in evicted:
+            self._memory.pop(key, None)
+            self._accessed.pop(key, None)
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+def get_shared_cache() -> ResponseCache:
+    """Returns the process-wide cache used by every provider"""
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = ResponseCache()
+        return _shared_cache
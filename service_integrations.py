@@ -0,0 +1,294 @@
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+from gmail_sync import PAGE_SIZE, FakeGmailService, GmailSync, MessageStore
+
+SCOPES = [
+    'https://www.googleapis.com/auth/calendar.readonly',
+    'https://www.googleapis.com/auth/gmail.readonly'
+]
+
+class ServiceIntegrationManager:
+    """
+    Google Calendar and Gmail access through OAuth. The Google client libraries
+    are imported on first use, and all calls block, so callers run them off the UI thread.
+    """
+    def __init__(self, credentials_file: str = "credentials.json", token_file: str = "token.json"):
+        self.credentials_file = credentials_file
+        self.token_file = token_file
+        self.credentials = None
+        self._services = {}
+
+    def authenticate(self) -> bool:
+        try:
+            from google.auth.transport.requests import Request
+            from google.oauth2.credentials import Credentials
+            from google_auth_oauthlib.flow import InstalledAppFlow
+
+            credentials = None
+            if os.path.exists(self.token_file):
+                credentials = Credentials.from_authorized_user_file(self.token_file, SCOPES)
+            if not credentials or not credentials.valid:
+                if credentials and credentials.expired and credentials.refresh_token:
+                    credentials.refresh(Request())
+                else:
+                    if not os.path.exists(self.credentials_file):
+                        print(f"Google credentials not found: {self.credentials_file}")
+                        return False
+                    flow = InstalledAppFlow.from_client_secrets_file(self.credentials_file, SCOPES)
+                    credentials = flow.run_local_server(port=0)
+                with open(self.token_file, 'w') as f:
+                    f.write(credentials.to_json())
+            self.credentials = credentials
+            self._services = {}
+            return True
+        except Exception as e:
+            print(f"Google authentication failed: {e}")
+            return False
+
+    def get_calendar_events(self, max_results: int = 10) -> Dict:
+        try:
+            now = datetime.now(timezone.utc).isoformat()
+            result = self._service('calendar', 'v3').events().list(
+                calendarId='primary',
+                timeMin=now,
+                maxResults=max_results,
+                singleEvents=True,
+                orderBy='startTime'
+            ).execute()
+            return {'events': result.get('items', [])}
+        except Exception as e:
+            return {'error': str(e)}
+
+    def get_emails(self, max_results: int = 10) -> Dict:
+        try:
+            messages = self._service('gmail', 'v1').users().messages()
+            listing = messages.list(userId='me', maxResults=max_results).execute()
+            emails = []
+            for item in listing.get('messages', []):
+                message = messages.get(
+                    userId='me',
+                    id=item['id'],
+                    format='metadata',
+                    metadataHeaders=['Subject', 'From', 'Date']
+                ).execute()
+                headers = {header['name'].lower(): header['value'] for header in message['payload'].get('headers', [])}
+                emails.append({
+                    'id': item['id'],
+                    'subject': headers.get('subject', 'No Subject'),
+                    'from': headers.get('from', 'Unknown Sender'),
+                    'date': headers.get('date', 'No Date')
+                })
+            return {'messages': emails}
+        except Exception as e:
+            return {'error': str(e)}
+
+    def gmail_service(self):
+        """The Gmail API resource, for incremental sync with GmailSync"""
+        return self._service('gmail', 'v1')
+
+    def _service(self, name: str, version: str):
+        if name not in self._services:
+            from googleapiclient.discovery import build
+            self._services[name] = build(name, version, credentials=self.credentials, cache_discovery=False)
+        return self._services[name]
+
+class LocalServiceBackend:
+    """
+    Offline stand-in with the same interface as ServiceIntegrationManager, for
+    development and testing. Data comes from a JSON file with "events" and
+    "messages" lists when it exists, or from generated samples otherwise.
+    """
+    def __init__(self, data_file: str = "local_services.json", delay: float = 0.0):
+        self.data_file = data_file
+        self.delay = delay
+        self.credentials = None
+        self._gmail = None
+
+    def authenticate(self) -> bool:
+        self.credentials = "local"
+        return True
+
+    def get_calendar_events(self, max_results: int = 10) -> Dict:
+        return {'events': self._load()['events'][:max_results]}
+
+    def get_emails(self, max_results: int = 10) -> Dict:
+        return {'messages': self._load()['messages'][:max_results]}
+
+    def gmail_service(self) -> FakeGmailService:
+        """An in-process Gmail API holding the local messages, oldest first"""
+        if self._gmail is None:
+            self._gmail = FakeGmailService()
+            for message in reversed(self._load()['messages']):
+                self._gmail.add_message(message['subject'], message['from'])
+        return self._gmail
+
+    def _load(self) -> Dict:
+        # Simulates a slow network round-trip
+        if self.delay:
+            time.sleep(self.delay)
+        if os.path.exists(self.data_file):
+            with open(self.data_file, 'r') as f:
+                data = json.load(f)
+            return {'events': data.get('events', []), 'messages': data.get('messages', [])}
+        # Rounded so repeated refreshes return the same samples
+        now = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+        return {
+            'events': [
+                {
+                    'id': f"local-event-{i}",
+                    'summary': f"Sample event {i + 1}",
+                    'start': {'dateTime': (now + timedelta(days=i, hours=1)).isoformat()},
+                    'location': "Local"
+                }
+                for i in range(3)
+            ],
+            'messages': [
+                {
+                    'id': f"local-message-{i}",
+                    'subject': f"Sample message {i + 1}",
+                    'from': "sample@example.com",
+                    'date': (now - timedelta(hours=i)).strftime("%a, %d %b %Y %H:%M:%S %z")
+                }
+                for i in range(100)
+            ]
+        }
+
+class ServiceLayer:
+    """
+    Background-loaded front for a service backend. The backend is only created and
+    authenticated when data is first needed, on a worker thread. Calendar events are
+    cached in memory and on disk, and email headers are synced incrementally into a
+    local message store, so both can be shown immediately while a refresh runs in
+    the background; refreshes report back only when the data changed.
+    """
+    def __init__(self, backend_factory: Callable[[], object], submit: Callable,
+                 cache_file: str = "sag_ine_services.json", mail_db: str = "sag_ine_mail.db",
+                 max_age: float = 300):
+        self.backend_factory = backend_factory
+        self.submit = submit
+        self.cache_file = cache_file
+        self.max_age = max_age
+        self.mail_store = MessageStore(mail_db)
+        self._backend = None
+        self._mail_sync = None
+        self._lock = threading.Lock()
+        # (on_update, report_always) of the callers waiting for each running refresh
+        self._waiting: Dict[str, List[Tuple[Callable[[Dict], None], bool]]] = {}
+        self._cache = self._load_cache()
+
+    def cached(self, kind: str) -> Optional[Dict]:
+        """Returns {"items": [...], "updated": timestamp} from the last refresh, or None"""
+        if kind == "email":
+            # Only the newest page; older ones are read with load_more
+            synced_at = self.mail_store.get_state("synced_at")
+            if synced_at is None:
+                return None
+            return {"items": self.mail_store.page(0, PAGE_SIZE), "updated": float(synced_at)}
+        with self._lock:
+            return self._cache.get(kind)
+
+    def refresh(self, kind: str, on_update: Callable[[Dict], None], force: bool = False):
+        """
+        Fetches fresh data in the background unless the cache is recent enough.
+        on_update runs on the worker with {"items": ..., "updated": ...} when the data
+        changed, when there was nothing cached yet, or when force is set, and with
+        {"error": ...} when it could not be fetched.
+        """
+        entry = self.cached(kind)
+        # A caller without cached data is waiting for an answer even if it is empty
+        waiter = (on_update, force or entry is None)
+        with self._lock:
+            if not force and entry and time.time() - entry["updated"] < self.max_age:
+                return
+            if kind in self._waiting:
+                # Already running; report its result to this caller too
+                self._waiting[kind].append(waiter)
+                return
+            self._waiting[kind] = [waiter]
+        # One key for all service calls, since the Google clients are not thread-safe
+        self.submit(self._refresh, kind, key="services")
+
+    def load_more(self, offset: int, on_page: Callable[[List[Dict]], None]):
+        """
+        Reads the page of email headers starting at offset in the background, fetching
+        older messages from the server once the local store runs out. on_page runs on
+        the worker with the page, which is empty at the end of the mailbox.
+        """
+        self.submit(self._load_more, offset, on_page, key="services")
+
+    def _refresh(self, kind: str):
+        try:
+            if kind == "email":
+                changed = self._sync_mail()
+                entry = self.cached("email")
+            else:
+                changed, entry = self._refresh_calendar()
+        except Exception as e:
+            changed, entry = True, {'error': str(e)}
+        with self._lock:
+            waiters = self._waiting.pop(kind)
+        for on_update, report_always in waiters:
+            if changed or report_always:
+                on_update(entry)
+
+    def _refresh_calendar(self) -> Tuple[bool, Dict]:
+        result = self._get_backend().get_calendar_events()
+        if 'error' in result:
+            raise RuntimeError(result['error'])
+        items = result.get('events', [])
+        with self._lock:
+            previous = self._cache.get("calendar")
+            self._cache["calendar"] = {"items": items, "updated": time.time()}
+            snapshot = dict(self._cache)
+        self._save_cache(snapshot)
+        return previous is None or previous["items"] != items, snapshot["calendar"]
+
+    def _sync_mail(self) -> bool:
+        stored, removed = self._get_mail_sync().sync()
+        return bool(stored or removed)
+
+    def _load_more(self, offset: int, on_page: Callable[[List[Dict]], None]):
+        items = self.mail_store.page(offset, PAGE_SIZE)
+        try:
+            if len(items) < PAGE_SIZE and self.mail_store.has_older():
+                self._get_mail_sync().load_older(PAGE_SIZE)
+                items = self.mail_store.page(offset, PAGE_SIZE)
+        except Exception as e:
+            print(f"Could not load older emails: {e}")
+        on_page(items)
+
+    def _get_backend(self):
+        if self._backend is None:
+            backend = self.backend_factory()
+            if not backend.authenticate():
+                raise RuntimeError("Failed to authenticate with Google services")
+            self._backend = backend
+        return self._backend
+
+    def _get_mail_sync(self) -> GmailSync:
+        if self._mail_sync is None:
+            self._mail_sync = GmailSync(self._get_backend().gmail_service(), self.mail_store)
+        return self._mail_sync
+
+    def _load_cache(self) -> Dict:
+        if not os.path.exists(self.cache_file):
+            return {}
+        try:
+            with open(self.cache_file, 'r') as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"Ignoring unreadable service cache: {e}")
+            return {}
+
+    def _save_cache(self, snapshot: Dict):
+        temp_path = f"{self.cache_file}.tmp"
+        try:
+            with open(temp_path, 'w') as f:
+                json.dump(snapshot, f)
+            os.replace(temp_path, self.cache_file)
+        except OSError as e:
+            print(f"Could not save service cache: {e}")
@@ -13,6 +13,7 @@ build_exe_options = {
         "webbrowser",
         "docx",
         "pandas",
+        "openpyxl",
         "PyPDF2",
         "openai",
         "google.generativeai",
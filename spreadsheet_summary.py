@@ -0,0 +1,123 @@
+from collections import Counter
+from typing import Dict, List, Optional
+import numpy as np
+import pandas as pd
+
+def _format_number(value) -> str:
+    return f"{value:.6g}" if isinstance(value, (float, np.floating)) else str(value)
+
+class _ColumnStats:
+    MAX_TRACKED_VALUES = 10000
+    TOP_VALUES = 5
+
+    def __init__(self, name: str, dtype):
+        self.name = name
+        self.dtype = dtype
+        self.numeric = pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype)
+        self.count = 0
+        self.nulls = 0
+        self.invalid = 0
+        self.total = 0.0
+        self.total_squares = 0.0
+        self.minimum = None
+        self.maximum = None
+        self.values = Counter()
+        self.values_truncated = False
+
+    def update(self, series: pd.Series):
+        if self.numeric:
+            values = pd.to_numeric(series, errors='coerce')
+            # Values that stopped parsing as numbers after the first chunk
+            self.invalid += int((values.isna() & series.notna()).sum())
+            self.nulls += int(series.isna().sum())
+            values = values.dropna()
+            if values.empty:
+                return
+            as_float = values.astype('float64')
+            self.count += len(values)
+            self.total += float(as_float.sum())
+            self.total_squares += float((as_float * as_float).sum())
+            low, high = values.min(), values.max()
+            self.minimum = low if self.minimum is None else min(self.minimum, low)
+            self.maximum = high if self.maximum is None else max(self.maximum, high)
+        else:
+            self.nulls += int(series.isna().sum())
+            values = series.dropna().astype(str)
+            self.count += len(values)
+            self.values.update(values.value_counts().to_dict())
+            if len(self.values) > self.MAX_TRACKED_VALUES:
+                # Keep memory bounded on high-cardinality columns; counts become approximate
+                self.values = Counter(dict(self.values.most_common(self.MAX_TRACKED_VALUES // 10)))
+                self.values_truncated = True
+
+    def describe(self) -> str:
+        text = f"- {self.name} ({self.dtype}): {self.count:,} values, {self.nulls:,} empty"
+        if self.numeric:
+            if self.count:
+                mean = self.total / self.count
+                std = max(self.total_squares / self.count - mean * mean, 0.0) ** 0.5
+                text += f", min {_format_number(self.minimum)}, max {_format_number(self.maximum)}"
+                text += f", mean {mean:.4g}, std {std:.4g}"
+            if self.invalid:
+                text += f", {self.invalid:,} non-numeric"
+        else:
+            distinct = f"{len(self.values):,}+" if self.values_truncated else f"{len(self.values):,}"
+            top = ", ".join(f"{value} ({count:,})" for value, count in self.values.most_common(self.TOP_VALUES))
+            text += f", {distinct} distinct"
+            if top:
+                text += f", most common: {top}"
+        return text
+
+class SpreadsheetSummary:
+    """
+    Builds a compact description of a spreadsheet from DataFrame chunks: schema,
+    per-column statistics and a uniform random sample of rows. Memory use depends
+    on the chunk size and sample size, not on the number of rows.
+    """
+    def __init__(self, sample_rows: int = 50, seed: int = 0):
+        self.sample_rows = sample_rows
+        self.row_count = 0
+        self.columns: Dict[str, _ColumnStats] = {}
+        self._rng = np.random.default_rng(seed)
+        self._sample: Optional[pd.DataFrame] = None
+        self._sample_keys = np.empty(0)
+
+    def update(self, chunk: pd.DataFrame):
+        if not self.columns:
+            # Types are inferred from the first chunk; later chunks are coerced to them
+            for name in chunk.columns:
+                self.columns[name] = _ColumnStats(str(name), chunk[name].dtype)
+        for name, stats in self.columns.items():
+            if name in chunk:
+                stats.update(chunk[name])
+
+        # Bottom-k sampling: keeping the rows with the smallest random keys gives a uniform sample
+        start = self.row_count
+        self.row_count += len(chunk)
+        chunk = chunk.set_axis(range(start, self.row_count))
+        keys = self._rng.random(len(chunk))
+        if self._sample is not None:
+            chunk = pd.concat([self._sample, chunk])
+            keys = np.concatenate([self._sample_keys, keys])
+        if len(chunk) > self.sample_rows:
+            keep = np.argpartition(keys, self.sample_rows)[:self.sample_rows]
+            chunk = chunk.iloc[keep]
+            keys = keys[keep]
+        self._sample = chunk
+        self._sample_keys = keys
+
+    def render(self, title: str) -> List[str]:
+        """Returns the description as segments: overview with schema, then sample rows"""
+        overview = [
+            f"Spreadsheet: {title}",
+            f"Rows: {self.row_count:,}  Columns: {len(self.columns)}",
+            "",
+            "Columns:"
+        ]
+        overview.extend(stats.describe() for stats in self.columns.values())
+        segments = ['\n'.join(overview)]
+        if self._sample is not None and len(self._sample):
+            sample = self._sample.sort_index()
+            label = "All rows" if len(sample) == self.row_count else f"Sample rows ({len(sample):,} of {self.row_count:,})"
+            segments.append(f"{label}:\n{sample.to_string()}")
+        return segments
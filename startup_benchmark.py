@@ -0,0 +1,78 @@
+import argparse
+import os
+import subprocess
+import sys
+import time
+from typing import List, Tuple
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+STARTUP_BUDGET = 1.0  # seconds until the window is shown
+
+def measure_imports(module: str = "ai_assistant_gui") -> List[Tuple[int, int, str]]:
+    """
+    Imports module in a fresh interpreter with -X importtime and returns
+    (self_us, cumulative_us, name) for every module that was loaded.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=APP_DIR, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr.strip().splitlines()[-1]}")
+    timings = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        # Nested imports are indented by two spaces per level
+        timings.append((int(self_us), int(cumulative_us), name[1:].rstrip()))
+    return timings
+
+def measure_window() -> float:
+    """Seconds from interpreter start until the main window has been drawn once"""
+    script = (
+        "import sys, time\n"
+        "from ai_assistant_gui import AIAssistantGUI\n"
+        "app = AIAssistantGUI(); app.update()\n"
+        "sys.stdout.write(str(time.time())); sys.stdout.flush()\n"
+        "app.on_closing()\n"
+    )
+    # Interpreter start-up is part of what the user waits for, so the clock starts here
+    started = time.time()
+    result = subprocess.run([sys.executable, "-c", script], cwd=APP_DIR, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"Starting the window failed:\n{result.stderr.strip()}")
+    return float(result.stdout) - started
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure how long Sag Ine takes to start")
+    parser.add_argument("--module", default="ai_assistant_gui", help="module to import")
+    parser.add_argument("--top", type=int, default=15, help="number of slowest imports to list")
+    parser.add_argument("--window", action="store_true", help="also time until the window is drawn (needs a display)")
+    parser.add_argument("--budget", type=float, default=STARTUP_BUDGET, help="fail above this many seconds")
+    args = parser.parse_args()
+
+    timings = measure_imports(args.module)
+    position = max(i for i, timing in enumerate(timings) if timing[2] == args.module)
+    total = timings[position][1]
+    print(f"import {args.module}: {total / 1000:.1f} ms")
+
+    # Imports are listed after everything they imported, so the module's own ones come right before it
+    start = position
+    while start > 0 and timings[start - 1][2].startswith(" "):
+        start -= 1
+    direct = [timing for timing in timings[start:position] if not timing[2][2:].startswith(" ")]
+    print(f"Slowest imports of {args.module}:")
+    for _, cumulative, name in sorted(direct, reverse=True, key=lambda timing: timing[1])[:args.top]:
+        print(f"  {cumulative / 1000:8.1f} ms  {name.strip()}")
+
+    elapsed = total / 1e6
+    if args.window:
+        elapsed = measure_window()
+        print(f"window shown after: {elapsed * 1000:.1f} ms")
+    if elapsed > args.budget:
+        print(f"Over the startup budget of {args.budget:.2f} s")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
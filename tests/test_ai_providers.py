@@ -0,0 +1,93 @@
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+from ai_providers import AIProvider, OllamaProvider
+from chunking import estimate_tokens, truncate_tokens
+from request_dispatcher import RequestHandle
+from response_cache import ResponseCache
+
+class FakeProvider(AIProvider):
+    """Answers every prompt with reply_chars characters and records the prompts"""
+    def __init__(self, reply_chars):
+        with mock.patch("ai_providers.get_shared_cache", return_value=ResponseCache(":memory:")):
+            super().__init__()
+        self.reply_chars = reply_chars
+        self.prompts = []
+
+    def generate_response(self, prompt):
+        self.prompts.append(prompt)
+        return "analysis line\n" * (self.reply_chars // 14)
+
+class AnalyzeChunksTest(unittest.TestCase):
+    def test_long_partial_analyses_are_trimmed_to_the_budget(self):
+        provider = FakeProvider(reply_chars=600)
+        chunks = [f"part {i} " * 40 for i in range(8)]
+        provider.analyze_chunks(chunks, "text", max_tokens=200)
+        self.assertGreater(len(provider.prompts), len(chunks))
+        for prompt in provider.prompts[len(chunks):]:
+            self.assertLessEqual(estimate_tokens(prompt), 200)
+        self.assertTrue(provider.prompts[-1].startswith("These are analyses of consecutive parts"))
+
+    def test_short_partial_analyses_are_combined_once(self):
+        provider = FakeProvider(reply_chars=100)
+        provider.analyze_chunks(["first part", "second part", "third part"], "text", max_tokens=500)
+        self.assertEqual(len(provider.prompts), 4)
+        self.assertEqual(provider.prompts[-1].count("analysis line"), 3 * (100 // 14))
+
+    def test_cancelled_analysis_stops(self):
+        provider = FakeProvider(reply_chars=100)
+        cancel = RequestHandle()
+        cancel.cancel()
+        self.assertEqual(provider.analyze_chunks(["a", "b"], "text", cancel=cancel), "File analysis stopped.")
+        self.assertEqual(provider.prompts, [])
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        if self.path == "/close":
+            # The client has to reconnect for its next request
+            self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, *args):
+        pass
+
+class ConnectionStatsTest(unittest.TestCase):
+    def setUp(self):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), KeepAliveHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        with mock.patch("ai_providers.get_shared_cache", return_value=ResponseCache(":memory:")):
+            self.provider = OllamaProvider("http://127.0.0.1", str(server.server_address[1]), "test")
+        self.addCleanup(self.provider.session.close)
+        self.url = self.provider.base_url
+
+    def test_requests_reuse_the_kept_alive_connection(self):
+        for _ in range(3):
+            self.provider.session.get(f"{self.url}/").close()
+        self.assertEqual(self.provider.connection_stats(), {"requests": 3, "connections": 1, "reused": 2})
+
+    def test_reconnects_are_counted(self):
+        self.provider.session.get(f"{self.url}/close").close()
+        self.provider.session.get(f"{self.url}/").close()
+        self.assertEqual(self.provider.connection_stats(), {"requests": 2, "connections": 2, "reused": 0})
+
+class TruncateTokensTest(unittest.TestCase):
+    def test_short_text_is_unchanged(self):
+        self.assertEqual(truncate_tokens("short text", 10), "short text")
+
+    def test_cuts_at_a_line_break_near_the_limit(self):
+        text = "first line\n" * 20
+        truncated = truncate_tokens(text, 10)
+        self.assertLessEqual(estimate_tokens(truncated), 10)
+        self.assertTrue(truncated.endswith("first line"))
+
+if __name__ == "__main__":
+    unittest.main()
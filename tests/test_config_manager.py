@@ -0,0 +1,118 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from config_manager import ConfigManager
+
+class ConfigManagerTest(unittest.TestCase):
+    def setUp(self):
+        temp = tempfile.TemporaryDirectory()
+        self.addCleanup(temp.cleanup)
+        cwd = os.getcwd()
+        os.chdir(temp.name)
+        self.addCleanup(os.chdir, cwd)
+        # The exit-time flush would write into whatever directory is current by then
+        patcher = mock.patch("config_manager.atexit.register")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def saved(self):
+        with open("sag_ine_config.json") as file:
+            return json.load(file)
+
+    def test_changes_within_the_delay_are_written_once(self):
+        config = ConfigManager(save_delay=0.05)
+        with mock.patch("config_manager.os.replace", wraps=os.replace) as replace:
+            for i in range(20):
+                config.add_recent_file(f"file{i}.txt")
+            config.set_ai_provider("ollama")
+            time.sleep(0.3)
+        self.assertEqual(replace.call_count, 1)
+        saved = self.saved()
+        self.assertEqual(saved["ai_provider"], "ollama")
+        self.assertEqual(saved["recent_files"][0], "file19.txt")
+        self.assertEqual(len(saved["recent_files"]), 10)
+
+    def test_flush_writes_pending_changes_immediately(self):
+        config = ConfigManager(save_delay=60)
+        config.set_semantic_search(True)
+        self.assertFalse(os.path.exists("sag_ine_config.json"))
+        config.flush()
+        self.assertTrue(self.saved()["semantic_search"])
+        self.assertIsNone(config._save_timer)
+
+    def test_flush_without_changes_does_not_write(self):
+        config = ConfigManager(save_delay=60)
+        with mock.patch("config_manager.os.replace") as replace:
+            config.flush()
+        replace.assert_not_called()
+
+    def test_failed_write_keeps_the_previous_file(self):
+        config = ConfigManager(save_delay=60)
+        config.set_ai_provider("ollama")
+        config.flush()
+        config.set_ai_provider("openai")
+        with mock.patch("config_manager.os.replace", side_effect=OSError("disk full")):
+            config.flush()
+        self.assertEqual(self.saved()["ai_provider"], "ollama")
+        # Still pending, so the next flush retries it
+        config.flush()
+        self.assertEqual(self.saved()["ai_provider"], "openai")
+
+    def test_corrupt_config_is_backed_up_and_reported(self):
+        with open("sag_ine_config.json", 'w') as file:
+            file.write('{"ai_provider": "ollama",')
+        config = ConfigManager(save_delay=60)
+        self.assertIsNotNone(config.load_error)
+        self.assertEqual(config.get_ai_provider(), "none")
+        backups = [name for name in os.listdir() if name.startswith("sag_ine_config.json.corrupt-")]
+        self.assertEqual(len(backups), 1)
+        with open(backups[0]) as file:
+            self.assertEqual(file.read(), '{"ai_provider": "ollama",')
+
+    def test_defaults_are_not_shared_between_instances(self):
+        config = ConfigManager(save_delay=60)
+        config.add_recent_file("a.txt")
+        self.assertEqual(config.default_config["recent_files"], [])
+
+    def test_setters_do_not_wait_for_a_slow_write(self):
+        config = ConfigManager(save_delay=60)
+        config.set_ai_provider("ollama")
+        writing = threading.Event()
+        real_fsync = os.fsync
+
+        def slow_fsync(fd):
+            writing.set()
+            time.sleep(0.5)
+            real_fsync(fd)
+
+        with mock.patch("config_manager.os.fsync", slow_fsync):
+            flusher = threading.Thread(target=config.flush)
+            flusher.start()
+            self.assertTrue(writing.wait(2))
+            started = time.time()
+            config.set_ai_provider("gemini")
+            self.assertLess(time.time() - started, 0.2)
+            flusher.join()
+        self.assertEqual(self.saved()["ai_provider"], "ollama")
+        config.flush()
+        self.assertEqual(self.saved()["ai_provider"], "gemini")
+
+    def test_ollama_settings_fill_in_new_keys(self):
+        with open("sag_ine_config.json", 'w') as file:
+            json.dump({"ollama": {"host": "http://server", "port": "1234", "model": "mistral"}}, file)
+        config = ConfigManager(save_delay=60)
+        settings = config.get_provider_settings("ollama")
+        self.assertEqual(settings["host"], "http://server")
+        self.assertEqual(settings["pool_size"], 4)
+        self.assertEqual(settings["keep_alive"], "30m")
+        config.config["ollama"]["pool_size"] = 8
+        config.set_ollama_settings("http://other", "11434", "llama3")
+        self.assertEqual(config.get_ollama_settings()["pool_size"], 8)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+import unittest
+
+from gmail_sync import FakeGmailService, GmailSync, MessageStore
+
+class GmailSyncTest(unittest.TestCase):
+    def setUp(self):
+        self.service = FakeGmailService()
+        self.ids = [self.service.add_message(f"Message {i}", "sender@example.com") for i in range(60)]
+        self.store = MessageStore(":memory:")
+        self.sync = GmailSync(self.service, self.store, initial_messages=40)
+
+    def stored_ids(self):
+        return {message['id'] for message in self.store.page(0, 1000)}
+
+    def synced(self):
+        """Runs a sync and returns (result, API requests it made)"""
+        before = self.service.request_count
+        result = self.sync.sync()
+        return result, self.service.request_count - before
+
+    def test_full_sync_stores_newest_messages(self):
+        result, requests = self.synced()
+        self.assertEqual(result, (40, 0))
+        # Profile, one listing and one batch per 50 headers
+        self.assertEqual(requests, 3)
+        self.assertEqual(self.stored_ids(), set(self.ids[-40:]))
+        self.assertEqual(self.store.page(0, 1)[0]['subject'], "Message 59")
+        self.assertTrue(self.store.has_older())
+
+    def test_sync_without_changes_makes_one_request(self):
+        self.sync.sync()
+        result, requests = self.synced()
+        self.assertEqual(result, (0, 0))
+        self.assertEqual(requests, 1)
+
+    def test_partial_sync_applies_added_deleted_and_relabelled_messages(self):
+        self.sync.sync()
+        new_id = self.service.add_message("New message", "new@example.com")
+        self.service.delete_message(self.ids[-1])
+        self.service.set_labels(self.ids[-2], remove=['INBOX'])
+        self.service.add_message("Archived", "other@example.com", labels=['ARCHIVE'])
+
+        result, requests = self.synced()
+        self.assertEqual(result, (1, 2))
+        # History listing and one batch for the new header
+        self.assertEqual(requests, 2)
+        stored = self.stored_ids()
+        self.assertIn(new_id, stored)
+        self.assertNotIn(self.ids[-1], stored)
+        self.assertNotIn(self.ids[-2], stored)
+        self.assertEqual(len(stored), 39)
+        self.assertEqual(self.store.page(0, 1)[0]['subject'], "New message")
+
+    def test_message_added_and_deleted_between_syncs_is_not_fetched(self):
+        self.sync.sync()
+        message_id = self.service.add_message("Short-lived", "sender@example.com")
+        self.service.delete_message(message_id)
+        result, requests = self.synced()
+        self.assertEqual(result, (0, 1))
+        self.assertEqual(requests, 1)
+        self.assertNotIn(message_id, self.stored_ids())
+
+    def test_expired_history_falls_back_to_full_sync(self):
+        self.sync.sync()
+        new_id = self.service.add_message("After expiry", "sender@example.com")
+        self.service.expire_history()
+
+        result, requests = self.synced()
+        self.assertEqual(result, (40, 0))
+        # Failed history listing, then profile, listing and one batch
+        self.assertEqual(requests, 4)
+        self.assertIn(new_id, self.stored_ids())
+        self.assertEqual(self.store.get_state("history_id"), self.service._get_profile()['historyId'])
+
+        result, requests = self.synced()
+        self.assertEqual((result, requests), ((0, 0), 1))
+
+    def test_load_older_pages_back_to_the_oldest_message(self):
+        self.sync.sync()
+        self.assertEqual(self.sync.load_older(15), 15)
+        self.assertEqual(self.store.count(), 55)
+        self.assertTrue(self.store.has_older())
+
+        before = self.service.request_count
+        self.assertEqual(self.sync.load_older(15), 5)
+        # One listing and one batch
+        self.assertEqual(self.service.request_count - before, 2)
+        self.assertFalse(self.store.has_older())
+        self.assertEqual(self.stored_ids(), set(self.ids))
+        self.assertEqual(self.store.page(55, 15)[-1]['subject'], "Message 0")
+
+        before = self.service.request_count
+        self.assertEqual(self.sync.load_older(15), 0)
+        self.assertEqual(self.service.request_count, before)
+
+    def test_pages_are_newest_first(self):
+        self.sync.sync()
+        subjects = [message['subject'] for message in self.store.page(0, 3)]
+        self.assertEqual(subjects, ["Message 59", "Message 58", "Message 57"])
+        self.assertEqual(self.store.page(30, 30)[-1]['subject'], "Message 20")
+
+if __name__ == "__main__":
+    unittest.main()
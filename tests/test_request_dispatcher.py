@@ -0,0 +1,117 @@
+import threading
+import time
+import unittest
+
+from request_dispatcher import RequestDispatcher, RequestHandle
+
+TIMEOUT = 2
+
+class RequestDispatcherTest(unittest.TestCase):
+    def dispatcher(self, max_workers):
+        dispatcher = RequestDispatcher(max_workers=max_workers)
+        self.addCleanup(dispatcher.shutdown)
+        return dispatcher
+
+    def blocking_task(self, log, name):
+        """Returns (task, started, release); the task records its name and waits for release"""
+        started = threading.Event()
+        release = threading.Event()
+
+        def task():
+            log.append(name)
+            started.set()
+            release.wait(TIMEOUT)
+
+        return task, started, release
+
+    def assert_concurrent(self, dispatcher, count):
+        """Checks that count tasks without a key all run at the same time"""
+        barrier = threading.Barrier(count + 1)
+        for _ in range(count):
+            dispatcher.submit(barrier.wait, TIMEOUT)
+        barrier.wait(TIMEOUT)
+
+    def test_tasks_with_the_same_key_run_in_order(self):
+        dispatcher = self.dispatcher(3)
+        log = []
+        first, first_started, release_first = self.blocking_task(log, "first")
+        dispatcher.submit(first, key="chat")
+        self.assertTrue(first_started.wait(TIMEOUT))
+
+        done = threading.Event()
+        dispatcher.submit(log.append, "second", key="chat")
+        dispatcher.submit(lambda: (log.append("third"), done.set()), key="chat")
+        # Another key is not held up by the running task
+        other, other_started, release_other = self.blocking_task(log, "other")
+        dispatcher.submit(other, key="files")
+        self.assertTrue(other_started.wait(TIMEOUT))
+        self.assertEqual(dispatcher.pending_count(), 2)
+        self.assertNotIn("second", log)
+
+        release_first.set()
+        self.assertTrue(done.wait(TIMEOUT))
+        release_other.set()
+        self.assertEqual([name for name in log if name != "other"], ["first", "second", "third"])
+
+    def test_failing_task_does_not_block_its_key(self):
+        dispatcher = self.dispatcher(1)
+        done = threading.Event()
+        dispatcher.submit(lambda: 1 / 0, key="chat")
+        dispatcher.submit(done.set, key="chat")
+        self.assertTrue(done.wait(TIMEOUT))
+
+    def test_resize_down(self):
+        dispatcher = self.dispatcher(3)
+        self.assert_concurrent(dispatcher, 3)
+        dispatcher.resize(1)
+        deadline = time.time() + TIMEOUT
+        while len(dispatcher._workers) > 1 and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(len(dispatcher._workers), 1)
+
+    def test_resize_down_then_up_keeps_all_workers(self):
+        dispatcher = self.dispatcher(3)
+        dispatcher.resize(1)
+        dispatcher.resize(3)
+        self.assert_concurrent(dispatcher, 3)
+        # Any leftover stop markers have been picked up by now
+        time.sleep(0.05)
+        self.assert_concurrent(dispatcher, 3)
+        self.assertEqual(len(dispatcher._workers), 3)
+
+class RequestHandleTest(unittest.TestCase):
+    def test_cancel_runs_callbacks_once(self):
+        handle = RequestHandle()
+        calls = []
+        handle.on_cancel(lambda: calls.append("close"))
+        handle.cancel()
+        handle.cancel()
+        self.assertTrue(handle.cancelled)
+        self.assertEqual(calls, ["close"])
+
+    def test_callback_registered_after_cancel_runs_immediately(self):
+        handle = RequestHandle()
+        handle.cancel()
+        calls = []
+        handle.on_cancel(lambda: calls.append("close"))
+        self.assertEqual(calls, ["close"])
+
+    def test_removed_callback_does_not_run(self):
+        handle = RequestHandle()
+        calls = []
+        callback = lambda: calls.append("close")
+        handle.on_cancel(callback)
+        handle.remove_callback(callback)
+        handle.cancel()
+        self.assertEqual(calls, [])
+
+    def test_wait_returns_early_on_cancel(self):
+        handle = RequestHandle()
+        self.assertFalse(handle.wait(0.01))
+        threading.Timer(0.05, handle.cancel).start()
+        started = time.time()
+        self.assertTrue(handle.wait(TIMEOUT))
+        self.assertLess(time.time() - started, 1)
+
+if __name__ == "__main__":
+    unittest.main()
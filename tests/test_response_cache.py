@@ -0,0 +1,103 @@
+import unittest
+from unittest import mock
+
+from response_cache import CacheKey, ResponseCache
+
+def key(prompt, **kwargs):
+    return CacheKey(kwargs.pop("provider", "ollama"), kwargs.pop("model", "llama3"), prompt, **kwargs)
+
+class CacheKeyTest(unittest.TestCase):
+    def test_settings_that_change_the_answer_change_the_key(self):
+        base = key("Explain WAL mode").digest()
+        self.assertNotEqual(base, key("Explain WAL mode", model="mistral").digest())
+        self.assertNotEqual(base, key("Explain WAL mode", provider="openai").digest())
+        self.assertNotEqual(base, key("Explain WAL mode", system_prompt="Be brief").digest())
+        self.assertNotEqual(base, key("Explain WAL mode", params={"temperature": 0.2}).digest())
+
+    def test_layout_inside_the_prompt_is_kept(self):
+        self.assertNotEqual(key("def f():\n  return 1").digest(), key("def f():\n    return 1").digest())
+        self.assertNotEqual(key("a | b\nc | d").digest(), key("a | b c | d").digest())
+
+    def test_line_endings_and_surrounding_whitespace_are_ignored(self):
+        self.assertEqual(key("first\r\nsecond\n").digest(), key("  first\nsecond").digest())
+
+class ResponseCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch("response_cache.time.time", lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def cache(self, **kwargs):
+        return ResponseCache(":memory:", **kwargs)
+
+    def tick(self, seconds=1.0):
+        self.now += seconds
+
+    def test_put_and_get(self):
+        cache = self.cache()
+        self.assertIsNone(cache.get(key("question")))
+        cache.put(key("question"), "answer")
+        self.assertEqual(cache.get(key("question")), "answer")
+
+    def test_entries_expire_after_ttl(self):
+        cache = self.cache(ttl_seconds=60)
+        cache.put(key("question"), "answer")
+        self.tick(59)
+        self.assertEqual(cache.get(key("question")), "answer")
+        self.tick(2)
+        self.assertIsNone(cache.get(key("question")))
+
+    def test_expired_entries_are_dropped_from_the_database(self):
+        cache = self.cache(ttl_seconds=60, memory_entries=0)
+        cache.put(key("old"), "x" * 10)
+        self.tick(61)
+        cache.put(key("new"), "y" * 10)
+        self.assertEqual(cache._total_bytes, 10)
+        self.assertIsNone(cache.get(key("old")))
+
+    def test_byte_budget_evicts_least_recently_used(self):
+        cache = self.cache(max_bytes=100, memory_entries=0)
+        for i in range(5):
+            cache.put(key(f"q{i}"), "x" * 20)
+            self.tick()
+        # Reading q0 makes q1 the least recently used
+        cache.get(key("q0"))
+        self.tick()
+        cache.put(key("q5"), "x" * 20)
+        self.assertEqual(cache.get(key("q0")), "x" * 20)
+        self.assertIsNone(cache.get(key("q1")))
+        self.assertLessEqual(cache._total_bytes, 100)
+
+    def test_entry_read_from_memory_is_not_evicted_first(self):
+        cache = self.cache(max_bytes=100)
+        cache.put(key("hot"), "x" * 20)
+        for i in range(6):
+            self.tick()
+            self.assertEqual(cache.get(key("hot")), "x" * 20)
+            self.tick()
+            cache.put(key(f"cold{i}"), "y" * 20)
+        cache._memory.clear()
+        self.assertEqual(cache.get(key("hot")), "x" * 20)
+        self.assertIsNone(cache.get(key("cold0")))
+
+    def test_responses_over_the_budget_are_not_stored(self):
+        cache = self.cache(max_bytes=10)
+        cache.put(key("question"), "x" * 11)
+        self.assertIsNone(cache.get(key("question")))
+
+    def test_replacing_an_entry_updates_the_size(self):
+        cache = self.cache()
+        cache.put(key("question"), "x" * 50)
+        cache.put(key("question"), "x" * 20)
+        self.assertEqual(cache._total_bytes, 20)
+
+    def test_clear(self):
+        cache = self.cache()
+        cache.put(key("question"), "answer")
+        cache.clear()
+        self.assertIsNone(cache.get(key("question")))
+        self.assertEqual(cache._total_bytes, 0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,148 @@
+import json
+import os
+import tempfile
+import unittest
+
+from vector_store import SemanticIndex, VectorStore, np
+
+class StubProvider:
+    """Embeds a text as (length, vowels, 1), so similar texts get similar vectors"""
+    name = "stub"
+    embedding_model = "test"
+
+    def __init__(self):
+        self.embedded = []
+
+    def embed(self, texts):
+        self.embedded.extend(texts)
+        return [[len(text), sum(text.count(vowel) for vowel in "aeiou"), 1.0] for text in texts]
+
+@unittest.skipIf(np is None, "numpy is not installed")
+class VectorStoreTest(unittest.TestCase):
+    def setUp(self):
+        temp = tempfile.TemporaryDirectory()
+        self.addCleanup(temp.cleanup)
+        self.directory = os.path.join(temp.name, "store")
+
+    def test_search_returns_nearest_rows(self):
+        store = VectorStore(self.directory)
+        store.append([[1, 0, 0], [0, 1, 0], [0.9, 0.1, 0]], "doc", ["x", "y", "almost x"])
+        hits = store.search([1, 0, 0], k=2)
+        self.assertEqual([text for _, _, text in hits], ["x", "almost x"])
+        self.assertEqual(store.search([1, 0, 0], k=5, source_filter=lambda source: source != "doc"), [])
+
+    def test_rows_survive_reopening(self):
+        VectorStore(self.directory).append([[1, 0], [0, 1]], "doc", ["a", "b"])
+        store = VectorStore(self.directory)
+        self.assertEqual(len(store), 2)
+        self.assertEqual(store.sources, {"doc"})
+        self.assertEqual(store.search([0, 1], k=1)[0][2], "b")
+
+    def test_extra_vectors_from_an_interrupted_append_are_dropped(self):
+        store = VectorStore(self.directory)
+        store.append([[1, 0], [0, 1]], "doc", ["a", "b"])
+        # Vectors are written before their metadata, so a crash can leave vectors without items
+        with open(store._vectors_path, 'ab') as file:
+            file.write(b"\0" * 8 * 3)
+        reopened = VectorStore(self.directory)
+        self.assertEqual(len(reopened), 2)
+        self.assertEqual(os.path.getsize(reopened._vectors_path), 2 * 2 * 4)
+        self.assertEqual(reopened.search([0, 1], k=1)[0][2], "b")
+
+    def test_items_without_vectors_are_dropped(self):
+        store = VectorStore(self.directory)
+        store.append([[1, 0], [0, 1]], "doc", ["a", "b"])
+        with open(store._vectors_path, 'r+b') as file:
+            file.truncate(2 * 4)
+        reopened = VectorStore(self.directory)
+        self.assertEqual([item["text"] for item in reopened.items], ["a"])
+        self.assertEqual(len(VectorStore(self.directory)), 1)
+
+    def test_dimension_mismatch_is_rejected(self):
+        store = VectorStore(self.directory)
+        store.append([[1, 0]], "doc", ["a"])
+        with self.assertRaises(ValueError):
+            store.append([[1, 0, 0]], "doc", ["b"])
+
+    def test_remove_compacts_into_a_new_generation(self):
+        store = VectorStore(self.directory)
+        store.append([[1, 0], [0, 1]], "old", ["a", "b"])
+        store.append([[1, 1]], "new", ["c"])
+        old_paths = (store._vectors_path, store._items_path)
+
+        self.assertEqual(store.remove(lambda source: source == "old"), 2)
+        self.assertEqual(store.generation, 1)
+        self.assertEqual([item["text"] for item in store.items], ["c"])
+        self.assertEqual(store.sources, {"new"})
+        self.assertFalse(any(os.path.exists(path) for path in old_paths))
+        with open(os.path.join(self.directory, "info.json")) as file:
+            self.assertEqual(json.load(file), {"dimension": 2, "generation": 1})
+
+        reopened = VectorStore(self.directory)
+        self.assertEqual(len(reopened), 1)
+        self.assertEqual(reopened.search([1, 1], k=5)[0][2], "c")
+        # Appends after a compaction go to the new files
+        reopened.append([[0, 1]], "later", ["d"])
+        self.assertEqual(len(VectorStore(self.directory)), 2)
+
+    def test_remove_without_matches_keeps_the_files(self):
+        store = VectorStore(self.directory)
+        store.append([[1, 0]], "doc", ["a"])
+        self.assertEqual(store.remove(lambda source: False), 0)
+        self.assertEqual(store.generation, 0)
+
+    def test_crash_before_switching_generation_keeps_the_old_version(self):
+        store = VectorStore(self.directory)
+        store.append([[1, 0], [0, 1]], "doc", ["a", "b"])
+        # Compacted files written, but info.json never updated
+        with open(os.path.join(self.directory, "vectors.1.f32"), 'wb') as file:
+            file.write(b"\0" * 8)
+        with open(os.path.join(self.directory, "items.1.jsonl"), 'w') as file:
+            file.write(json.dumps({"source": "doc", "text": "partial"}) + "\n")
+        reopened = VectorStore(self.directory)
+        self.assertEqual([item["text"] for item in reopened.items], ["a", "b"])
+
+@unittest.skipIf(np is None, "numpy is not installed")
+class SemanticIndexTest(unittest.TestCase):
+    def setUp(self):
+        temp = tempfile.TemporaryDirectory()
+        self.addCleanup(temp.cleanup)
+        self.root = temp.name
+        self.path = os.path.join(temp.name, "notes.txt")
+        with open(self.path, 'w') as file:
+            file.write("notes")
+        self.provider = StubProvider()
+        self.index = SemanticIndex(self.provider, root=os.path.join(temp.name, "vectors"))
+
+    def touch(self, seconds):
+        mtime = os.path.getmtime(self.path) + seconds
+        os.utime(self.path, (mtime, mtime))
+
+    def test_unchanged_file_is_embedded_once(self):
+        self.index.add_file(self.path, ["alpha", "beta"])
+        self.index.add_file(self.path, ["alpha", "beta"])
+        self.assertEqual(self.provider.embedded, ["alpha", "beta"])
+
+    def test_new_version_replaces_the_rows_of_the_old_one(self):
+        self.index.add_file(self.path, ["alpha", "beta"])
+        self.index.add_texts("chat", ["hello"])
+        self.touch(5)
+        self.index.add_file(self.path, ["gamma"])
+
+        store = self.index.store
+        self.assertEqual(sorted(item["text"] for item in store.items), ["gamma", "hello"])
+        self.assertEqual(store.sources, {"chat", SemanticIndex.file_source(self.path)})
+        self.assertEqual(self.index.search_files("gamma", [self.path]), [(os.path.abspath(self.path), "gamma")])
+
+    def test_other_files_with_a_common_prefix_are_kept(self):
+        other = self.path + ".bak"
+        with open(other, 'w') as file:
+            file.write("backup")
+        self.index.add_file(other, ["backup"])
+        self.index.add_file(self.path, ["alpha"])
+        self.touch(5)
+        self.index.add_file(self.path, ["beta"])
+        self.assertEqual(sorted(item["text"] for item in self.index.store.items), ["backup", "beta"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,45 @@
+import unittest
+from unittest import mock
+
+from web_retrieval import BM25Index, retrieve_passages
+from web_search import SearchResult
+
+def result(name):
+    return SearchResult(f"{name} title", f"{name} snippet", f"https://example.com/{name}")
+
+class BM25IndexTest(unittest.TestCase):
+    def test_ranks_matching_passages_first(self):
+        index = BM25Index(["the cat sat", "write ahead logging in sqlite", "sqlite is a database"])
+        self.assertEqual([position for _, position in index.top_k("sqlite logging")], [1, 2])
+
+class RetrievePassagesTest(unittest.TestCase):
+    def setUp(self):
+        self.results = {
+            "sqlite wal": [result("wal"), result("shared")],
+            "postgres mvcc": [result("mvcc"), result("shared")],
+        }
+        patcher = mock.patch("web_retrieval.fetch_results", side_effect=lambda query, num: self.results[query][:num])
+        self.fetch_results = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_each_query_is_searched_separately(self):
+        with mock.patch("web_retrieval.fetch_page_text", side_effect=OSError("offline")):
+            passages = retrieve_passages("sqlite wal; postgres mvcc")
+        self.assertEqual(sorted(call.args[0] for call in self.fetch_results.call_args_list),
+                         ["postgres mvcc", "sqlite wal"])
+        # No page could be fetched, so the snippets are used, each link once
+        self.assertEqual([text for _, text in passages], ["wal snippet", "shared snippet", "mvcc snippet"])
+
+    def test_passages_are_ranked_against_all_queries(self):
+        pages = {
+            "https://example.com/wal": "Write ahead logging lets sqlite readers run during a write",
+            "https://example.com/shared": "This page has nothing useful on it at all",
+            "https://example.com/mvcc": "Postgres mvcc keeps old row versions for running readers",
+        }
+        with mock.patch("web_retrieval.fetch_page_text", side_effect=lambda url: pages[url]):
+            passages = retrieve_passages("sqlite wal; postgres mvcc")
+        self.assertEqual(sorted(found.link for found, _ in passages),
+                         ["https://example.com/mvcc", "https://example.com/wal"])
+
+if __name__ == "__main__":
+    unittest.main()
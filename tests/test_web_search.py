@@ -0,0 +1,65 @@
+import os
+import unittest
+from unittest import mock
+
+import web_search
+from web_search import FIXTURE_DIR, SearchResult, benchmark_parse, fetch_results, parse_results, split_queries
+
+class ParseResultsTest(unittest.TestCase):
+    def setUp(self):
+        with open(os.path.join(FIXTURE_DIR, "duckduckgo_results.html"), 'r', encoding='utf-8') as file:
+            self.page = file.read()
+
+    def test_parses_saved_results_page(self):
+        results = parse_results(self.page, num_results=10)
+        self.assertEqual(len(results), 10)
+        self.assertIsInstance(results[1], SearchResult)
+        self.assertEqual(results[1].title, "Write-Ahead Logging - SQLite")
+        self.assertTrue(results[1].snippet.startswith("The default method by which SQLite implements atomic commit"))
+        self.assertIn("uddg=https%3A%2F%2Fwww.sqlite.org%2Fwal.html", results[1].link)
+
+    def test_stops_at_requested_number_of_results(self):
+        results = parse_results(self.page)
+        self.assertEqual([result.title for result in results], [result.title for result in parse_results(self.page, 10)[:5]])
+
+    def test_page_without_results(self):
+        self.assertEqual(parse_results("<html><body><div id='links'></div></body></html>"), [])
+
+    def test_benchmark_reports_parse_time(self):
+        self.assertGreater(benchmark_parse(self.page, runs=2), 0)
+
+class SplitQueriesTest(unittest.TestCase):
+    def test_splits_on_semicolons_and_drops_empty_queries(self):
+        self.assertEqual(split_queries(" sqlite wal ;postgres mvcc;; "), ["sqlite wal", "postgres mvcc"])
+
+    def test_single_query_is_kept_whole(self):
+        self.assertEqual(split_queries("python sqlite wal mode"), ["python sqlite wal mode"])
+
+class FetchResultsTest(unittest.TestCase):
+    def setUp(self):
+        with open(os.path.join(FIXTURE_DIR, "duckduckgo_results.html"), 'r', encoding='utf-8') as file:
+            self.page = file.read()
+        self.addCleanup(web_search._cache.clear)
+        web_search._cache.clear()
+        patcher = mock.patch("web_search.get_session")
+        self.get = patcher.start().return_value.get
+        self.addCleanup(patcher.stop)
+
+    def respond(self, text):
+        self.get.return_value = mock.Mock(text=text)
+
+    def test_results_are_cached_per_normalized_query(self):
+        self.respond(self.page)
+        first = fetch_results("SQLite  WAL")
+        self.assertEqual(fetch_results("sqlite wal"), first)
+        self.assertEqual(self.get.call_count, 1)
+
+    def test_empty_results_are_not_cached(self):
+        self.respond("<html><body>Please verify you are human</body></html>")
+        self.assertEqual(fetch_results("sqlite wal"), [])
+        self.respond(self.page)
+        self.assertEqual(len(fetch_results("sqlite wal")), 5)
+        self.assertEqual(self.get.call_count, 2)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+import threading
+from typing import Callable, Dict, Hashable, List
+
+FRAME_INTERVAL_MS = 33  # about 30 updates per second
+
+class _TextDelta:
+    """Text deltas for one target, joined into a single handler call"""
+    def __init__(self, handler: Callable[[str], None]):
+        self.handler = handler
+        self.parts: List[str] = []
+
+    def __call__(self):
+        self.handler(''.join(self.parts))
+
+class UIDispatcher:
+    """
+    Hands updates from worker threads to the Tk main loop. Updates are queued
+    without touching Tk and applied in one batch per frame, on a fixed cadence.
+    Text deltas for the same target are joined, and keyed updates (like scrolling)
+    only run once per frame with their latest arguments.
+    """
+    def __init__(self, widget, interval: int = FRAME_INTERVAL_MS):
+        self.widget = widget
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._calls: List[Callable] = []
+        self._deltas: Dict[Hashable, _TextDelta] = {}
+        self._latest: Dict[Hashable, Callable] = {}
+        self._after_id = None
+        self._running = False
+
+    def start(self):
+        if not self._running:
+            self._running = True
+            self._after_id = self.widget.after(self.interval, self._drain)
+
+    def stop(self):
+        self._running = False
+        if self._after_id is not None:
+            self.widget.after_cancel(self._after_id)
+            self._after_id = None
+
+    def call(self, func: Callable, *args):
+        """Runs func(*args) on the UI thread, in order with other calls"""
+        with self._lock:
+            self._calls.append(lambda: func(*args))
+
+    def append_text(self, target: Hashable, text: str, handler: Callable[[str], None]):
+        """Queues a text delta; all deltas for target in a frame reach handler as one string"""
+        with self._lock:
+            delta = self._deltas.get(target)
+            if delta is None:
+                # Keeps its place among the other calls, so a later completion still runs after it
+                delta = self._deltas[target] = _TextDelta(handler)
+                self._calls.append(delta)
+            delta.parts.append(text)
+
+    def coalesce(self, key: Hashable, func: Callable, *args):
+        """Runs func(*args) once at the end of the next frame, replacing earlier requests with the same key"""
+        with self._lock:
+            self._latest[key] = lambda: func(*args)
+
+    def _drain(self):
+        self._after_id = None
+        with self._lock:
+            calls = self._calls
+            latest = list(self._latest.values())
+            self._calls = []
+            self._deltas = {}
+            self._latest = {}
+        for func in calls + latest:
+            try:
+                func()
+            except Exception as e:
+                print(f"Error applying UI update: {e}")
+        if self._running:
+            self._after_id = self.widget.after(self.interval, self._drain)
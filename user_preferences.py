@@ -0,0 +1,55 @@
+import copy
+import json
+import os
+from typing import Any, Dict
+
+class UserPreferences:
+    def __init__(self, preferences_file: str = "user_preferences.json"):
+        self.preferences_file = preferences_file
+        self.default_preferences = {
+            "theme": "dark",
+            "personalization": {
+                "assistant_name": "Sag Ine"
+            },
+            "services": {
+                "backend": "google",  # google, or local for the offline stand-in
+                "refresh_seconds": 300
+            }
+        }
+        self.preferences = self.load_preferences()
+
+    def load_preferences(self) -> Dict:
+        preferences = copy.deepcopy(self.default_preferences)
+        if os.path.exists(self.preferences_file):
+            try:
+                with open(self.preferences_file, 'r') as f:
+                    saved = json.load(f)
+                for key, value in saved.items():
+                    if isinstance(value, dict) and isinstance(preferences.get(key), dict):
+                        preferences[key].update(value)
+                    else:
+                        preferences[key] = value
+            except Exception as e:
+                print(f"Could not read {self.preferences_file}: {e}")
+        return preferences
+
+    def save_preferences(self):
+        with open(self.preferences_file, 'w') as f:
+            json.dump(self.preferences, f, indent=4)
+
+    def get_preference(self, *keys: str) -> Any:
+        """Looks up a nested preference, e.g. get_preference("personalization", "assistant_name")"""
+        value = self.preferences
+        for key in keys:
+            if not isinstance(value, dict) or key not in value:
+                return None
+            value = value[key]
+        return value
+
+    def set_preference(self, *keys_and_value):
+        *keys, value = keys_and_value
+        target = self.preferences
+        for key in keys[:-1]:
+            target = target.setdefault(key, {})
+        target[keys[-1]] = value
+        self.save_preferences()
@@ -0,0 +1,193 @@
+import json
+import os
+import re
+import threading
+from typing import Callable, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # Semantic search is optional
+    np = None
+
+EMBED_BATCH_SIZE = 32
+
+class VectorStore:
+    """
+    Append-only store of unit-length float32 embeddings in a flat file, read back
+    through a memory map so nearest-neighbour queries are one vectorized dot product.
+    Each row has a metadata line (source and text) in a JSON-lines file. Rows of
+    sources that are no longer needed are dropped with remove, which writes compacted
+    copies of both files and switches to them by rewriting info.json.
+    """
+    def __init__(self, directory: str):
+        if np is None:
+            raise RuntimeError("numpy is required for semantic search")
+        self.directory = directory
+        self._info_path = os.path.join(directory, "info.json")
+        self._lock = threading.Lock()
+        self._matrix = None
+        os.makedirs(directory, exist_ok=True)
+
+        self.dimension = 0
+        self.generation = 0
+        if os.path.exists(self._info_path):
+            with open(self._info_path, 'r') as file:
+                info = json.load(file)
+            self.dimension = info["dimension"]
+            self.generation = info.get("generation", 0)
+        self._vectors_path, self._items_path = self._paths(self.generation)
+        self.items = []
+        if os.path.exists(self._items_path):
+            with open(self._items_path, 'r', encoding='utf-8') as file:
+                self.items = [json.loads(line) for line in file if line.strip()]
+        self._drop_partial_rows()
+        self.sources = {item["source"] for item in self.items}
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def append(self, vectors: Sequence[Sequence[float]], source: str, texts: Sequence[str]):
+        if not len(vectors):
+            return
+        matrix = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix /= np.where(norms == 0, 1, norms)
+        with self._lock:
+            if not self.dimension:
+                self.dimension = matrix.shape[1]
+                self._write_info()
+            elif matrix.shape[1] != self.dimension:
+                raise ValueError(f"Expected {self.dimension}-dimensional embeddings, got {matrix.shape[1]}")
+            # Vectors first: a crash between the two writes leaves extra rows that are dropped on load
+            with open(self._vectors_path, 'ab') as file:
+                file.write(matrix.tobytes())
+            with open(self._items_path, 'a', encoding='utf-8') as file:
+                for text in texts:
+                    file.write(json.dumps({"source": source, "text": text}) + "\n")
+            self.items.extend({"source": source, "text": text} for text in texts)
+            self.sources.add(source)
+            self._matrix = None
+
+    def remove(self, source_filter: Callable[[str], bool]) -> int:
+        """Drops the rows whose source matches and compacts the store; returns how many were dropped"""
+        with self._lock:
+            keep = [i for i, item in enumerate(self.items) if not source_filter(item["source"])]
+            if len(keep) == len(self.items):
+                return 0
+            matrix = self._load_matrix()
+            vectors = np.asarray(matrix[keep] if keep else np.empty((0, self.dimension), dtype=np.float32))
+            items = [self.items[i] for i in keep]
+
+            # The new files only take effect once info.json names them, so a crash
+            # leaves either the old or the new version, never a mix of both
+            old_paths = (self._vectors_path, self._items_path)
+            generation = self.generation + 1
+            vectors_path, items_path = self._paths(generation)
+            with open(vectors_path, 'wb') as file:
+                file.write(vectors.tobytes())
+            with open(items_path, 'w', encoding='utf-8') as file:
+                for item in items:
+                    file.write(json.dumps(item) + "\n")
+            self.generation = generation
+            self._write_info()
+
+            removed = len(self.items) - len(items)
+            self._vectors_path, self._items_path = vectors_path, items_path
+            self.items = items
+            self.sources = {item["source"] for item in items}
+            self._matrix = None
+        for path in old_paths:
+            try:
+                os.remove(path)
+            except OSError:
+                # Still mapped by a running search on some platforms; only costs disk space
+                pass
+        return removed
+
+    def search(self, query_vector: Sequence[float], k: int = 5,
+               source_filter: Optional[Callable[[str], bool]] = None) -> List[Tuple[float, str, str]]:
+        """Returns up to k (score, source, text) tuples by cosine similarity"""
+        with self._lock:
+            matrix = self._load_matrix()
+            items = self.items
+        if matrix is None or not len(items):
+            return []
+        query = np.asarray(query_vector, dtype=np.float32)
+        query /= (np.linalg.norm(query) or 1)
+        scores = matrix @ query
+        if source_filter is not None:
+            mask = np.fromiter((source_filter(item["source"]) for item in items), dtype=bool, count=len(items))
+            scores = np.where(mask, scores, -np.inf)
+        k = min(k, len(scores))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        return [(float(scores[i]), items[i]["source"], items[i]["text"]) for i in best if np.isfinite(scores[i])]
+
+    def _load_matrix(self):
+        if self._matrix is None and self.items and os.path.exists(self._vectors_path):
+            self._matrix = np.memmap(self._vectors_path, dtype=np.float32, mode='r',
+                                     shape=(len(self.items), self.dimension))
+        return self._matrix
+
+    def _paths(self, generation: int) -> Tuple[str, str]:
+        suffix = f".{generation}" if generation else ""
+        return (os.path.join(self.directory, f"vectors{suffix}.f32"),
+                os.path.join(self.directory, f"items{suffix}.jsonl"))
+
+    def _write_info(self):
+        temp_path = f"{self._info_path}.tmp"
+        with open(temp_path, 'w') as file:
+            json.dump({"dimension": self.dimension, "generation": self.generation}, file)
+        os.replace(temp_path, self._info_path)
+
+    def _drop_partial_rows(self):
+        # Realign the two files after an interrupted append
+        rows = 0
+        if self.dimension and os.path.exists(self._vectors_path):
+            rows = os.path.getsize(self._vectors_path) // (4 * self.dimension)
+        if rows > len(self.items):
+            with open(self._vectors_path, 'r+b') as file:
+                file.truncate(len(self.items) * 4 * self.dimension)
+        elif rows < len(self.items):
+            self.items = self.items[:rows]
+            with open(self._items_path, 'w', encoding='utf-8') as file:
+                for item in self.items:
+                    file.write(json.dumps(item) + "\n")
+
+class SemanticIndex:
+    """Embeds file passages and chat messages through the active provider and searches them"""
+    def __init__(self, provider, root: str = "sag_ine_vectors"):
+        self.provider = provider
+        name = re.sub(r'[^\w.-]', '_', f"{provider.name}-{provider.embedding_model}")
+        self.store = VectorStore(os.path.join(root, name))
+
+    def add_texts(self, source: str, texts: List[str]):
+        for start in range(0, len(texts), EMBED_BATCH_SIZE):
+            batch = texts[start:start + EMBED_BATCH_SIZE]
+            self.store.append(self.provider.embed(batch), source, batch)
+
+    def add_file(self, path: str, passages: List[str]):
+        """
+        Embeds a file's passages unless this version of the file is already stored,
+        and drops the rows of its earlier versions
+        """
+        source = self.file_source(path)
+        if source in self.store.sources:
+            return
+        self.add_texts(source, passages)
+        prefix = source[:source.rindex('@') + 1]
+        self.store.remove(lambda stored: stored.startswith(prefix) and stored != source)
+
+    @staticmethod
+    def file_source(path: str) -> str:
+        path = os.path.abspath(path)
+        return f"file:{path}@{os.path.getmtime(path)}"
+
+    def search(self, query: str, k: int = 5, source_filter: Optional[Callable[[str], bool]] = None):
+        return self.store.search(self.provider.embed([query])[0], k, source_filter)
+
+    def search_files(self, query: str, files: List[str], k: int = 5) -> List[Tuple[str, str]]:
+        """Returns (path, passage) pairs from the current versions of the given files"""
+        wanted = {self.file_source(path): os.path.abspath(path) for path in files if os.path.exists(path)}
+        hits = self.search(query, k, wanted.__contains__)
+        return [(wanted[source], text) for _, source, text in hits]
@@ -0,0 +1,149 @@
+import math
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+from bs4 import BeautifulSoup
+from chunking import chunk_segments, estimate_tokens, tokenize
+from web_search import (HTML_PARSER, MAX_PARALLEL_SEARCHES, REQUEST_TIMEOUT, SearchResult, fetch_results,
+                        get_session, split_queries)
+
+MAX_PAGES = 3
+MAX_PARALLEL_FETCHES = 4
+MAX_PAGE_BYTES = 512 * 1024
+PASSAGE_TOKENS = 200
+CONTEXT_TOKENS = 1500
+
+BOILERPLATE_TAGS = ['script', 'style', 'noscript', 'nav', 'header', 'footer', 'aside', 'form', 'svg', 'iframe']
+class BM25Index:
+    """Small in-memory BM25 ranker for a handful of passages"""
+    def __init__(self, passages: List[str], k1: float = 1.5, b: float = 0.75):
+        self.passages = passages
+        self.k1 = k1
+        self.b = b
+        self._term_counts = [Counter(tokenize(passage)) for passage in passages]
+        self._lengths = [sum(counts.values()) for counts in self._term_counts]
+        self._average_length = (sum(self._lengths) / len(passages)) if passages else 0
+        self._doc_freq = Counter()
+        for counts in self._term_counts:
+            self._doc_freq.update(counts.keys())
+
+    def top_k(self, query: str, k: int = 5) -> List[Tuple[float, int]]:
+        """Returns (score, passage_index) pairs for the best matching passages"""
+        terms = set(tokenize(query))
+        total = len(self.passages)
+        scores = []
+        for index, counts in enumerate(self._term_counts):
+            score = 0.0
+            length_norm = 1 - self.b + self.b * self._lengths[index] / (self._average_length or 1)
+            for term in terms:
+                frequency = counts.get(term)
+                if not frequency:
+                    continue
+                idf = math.log(1 + (total - self._doc_freq[term] + 0.5) / (self._doc_freq[term] + 0.5))
+                score += idf * frequency * (self.k1 + 1) / (frequency + self.k1 * length_norm)
+            if score > 0:
+                scores.append((score, index))
+        scores.sort(reverse=True)
+        return scores[:k]
+
+def resolve_link(link: Optional[str]) -> Optional[str]:
+    """DuckDuckGo wraps result links in a redirect; returns the target URL"""
+    if not link:
+        return None
+    if link.startswith('//'):
+        link = 'https:' + link
+    parsed = urlparse(link)
+    if 'duckduckgo.com' in parsed.netloc and parsed.path.startswith('/l/'):
+        target = parse_qs(parsed.query).get('uddg')
+        return target[0] if target else None
+    return link if parsed.scheme in ('http', 'https') else None
+
+def fetch_page_text(url: str, max_bytes: int = MAX_PAGE_BYTES) -> str:
+    """Downloads at most max_bytes of an HTML page and returns its main text"""
+    with get_session().get(url, timeout=REQUEST_TIMEOUT, stream=True) as response:
+        response.raise_for_status()
+        if 'html' not in response.headers.get('Content-Type', 'text/html'):
+            return ""
+        body = bytearray()
+        for block in response.iter_content(chunk_size=16384):
+            body.extend(block)
+            if len(body) >= max_bytes:
+                break
+    # Passing bytes lets BeautifulSoup pick the encoding from the page itself
+    soup = BeautifulSoup(bytes(body[:max_bytes]), HTML_PARSER)
+    for tag in soup(BOILERPLATE_TAGS):
+        tag.decompose()
+    lines = (line.strip() for line in soup.get_text('\n').splitlines())
+    # Menus and link lists leave many one or two word lines behind
+    return '\n'.join(line for line in lines if len(line.split()) > 3)
+
+def _fetch_passages(result: SearchResult) -> List[str]:
+    url = resolve_link(result.link)
+    if not url:
+        return []
+    try:
+        text = fetch_page_text(url)
+    except Exception:
+        return []
+    return list(chunk_segments(text.split('\n'), PASSAGE_TOKENS, separator='\n'))
+
+def _search_all(queries: List[str], num_pages: int) -> List[SearchResult]:
+    """Runs the searches concurrently and merges their results, dropping repeated links"""
+    if len(queries) == 1:
+        return fetch_results(queries[0], num_pages)
+    with ThreadPoolExecutor(max_workers=min(MAX_PARALLEL_SEARCHES, len(queries))) as executor:
+        result_lists = list(executor.map(lambda query: fetch_results(query, num_pages), queries))
+    results = []
+    seen = set()
+    for result in (result for results_for_query in result_lists for result in results_for_query):
+        if result.link not in seen:
+            seen.add(result.link)
+            results.append(result)
+    return results
+
+def retrieve_passages(query: str, num_pages: int = MAX_PAGES,
+                      max_tokens: int = CONTEXT_TOKENS) -> List[Tuple[SearchResult, str]]:
+    """
+    Fetches the top search result pages concurrently and returns the passages that
+    best match the query, within a token budget. Falls back to the search snippets
+    when no page could be fetched. A query such as "sqlite wal; postgres mvcc" runs
+    one search per part, fetching up to num_pages pages for each.
+    """
+    queries = split_queries(query) or [query]
+    results = _search_all(queries, num_pages)
+    with ThreadPoolExecutor(max_workers=min(MAX_PARALLEL_FETCHES, max(1, len(results)))) as executor:
+        page_passages = list(executor.map(_fetch_passages, results))
+
+    candidates = [(result, passage) for result, passages in zip(results, page_passages) for passage in passages]
+    if not candidates:
+        return [(result, result.snippet) for result in results]
+
+    index = BM25Index([passage for _, passage in candidates])
+    selected = []
+    used_tokens = 0
+    for _, position in index.top_k(' '.join(queries), k=len(candidates)):
+        result, passage = candidates[position]
+        tokens = estimate_tokens(passage)
+        if used_tokens + tokens > max_tokens:
+            break
+        selected.append((result, passage))
+        used_tokens += tokens
+    return selected or [(result, result.snippet) for result in results]
+
+def build_grounded_prompt(query: str, num_pages: int = MAX_PAGES, max_tokens: int = CONTEXT_TOKENS) -> str:
+    """Builds a prompt that asks the model to answer the query from retrieved web passages"""
+    passages = retrieve_passages(query, num_pages, max_tokens)
+    if not passages:
+        return query
+    sources = []
+    numbers = {}
+    for result, passage in passages:
+        number = numbers.setdefault(result.link, len(numbers) + 1)
+        sources.append(f"[{number}] {result.title} ({resolve_link(result.link) or result.link})\n{passage}")
+    context = '\n\n'.join(sources)
+    return (
+        "Answer the question using the web sources below, and cite them by number. "
+        "If they do not contain the answer, say so.\n\n"
+        f"{context}\n\nQuestion: {query}"
+    )
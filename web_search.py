@@ -1,45 +1,156 @@
+import glob
+import os
 import requests
-from bs4 import BeautifulSoup
-from typing import List, Dict
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from requests.adapters import HTTPAdapter
+from bs4 import BeautifulSoup, SoupStrainer
+from typing import List, Optional
+
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = 'lxml'
+except ImportError:
+    HTML_PARSER = 'html.parser'
+
+SEARCH_URL = "https://html.duckduckgo.com/html/"
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+}
+REQUEST_TIMEOUT = (5, 10)  # (connect, read) seconds
+CACHE_TTL = 15 * 60
+CACHE_SIZE = 256
+MAX_PARALLEL_SEARCHES = 4
+# Saved results pages the parse benchmark runs against by default
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tests", "fixtures")
+
+def _is_result_block(css_class) -> bool:
+    # Depending on the bs4 version the strainer sees the whole class string or single classes
+    return css_class is not None and 'result' in css_class.split()
+
+# Only the result blocks are turned into a tree; the rest of the page is skipped
+RESULT_STRAINER = SoupStrainer('div', class_=_is_result_block)
+
+@dataclass(frozen=True)
+class SearchResult:
+    title: str
+    snippet: str
+    link: Optional[str]
+
+_session = None
+_session_lock = threading.Lock()
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+def get_session() -> requests.Session:
+    """Returns the shared keep-alive session used for all search traffic"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            _session.headers.update(HEADERS)
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=MAX_PARALLEL_SEARCHES * 2)
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+        return _session
+
+def _normalize_query(query: str) -> str:
+    return ' '.join(query.lower().split())
+
+def _cached_results(key) -> List[SearchResult] | None:
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry is None:
+            return None
+        stored_at, results = entry
+        if time.time() - stored_at > CACHE_TTL:
+            del _cache[key]
+            return None
+        _cache.move_to_end(key)
+        return results
+
+def _store_results(key, results: List[SearchResult]):
+    with _cache_lock:
+        _cache[key] = (time.time(), results)
+        _cache.move_to_end(key)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+
+def parse_results(html: str, num_results: int = 5) -> List[SearchResult]:
+    soup = BeautifulSoup(html, HTML_PARSER, parse_only=RESULT_STRAINER)
+    results = []
+    for result in soup.find_all('div', class_='result'):
+        title = result.find('a', class_='result__a')
+        snippet = result.find('a', class_='result__snippet')
+        if title and snippet:
+            results.append(SearchResult(title.get_text().strip(), snippet.get_text().strip(), title.get('href')))
+            if len(results) >= num_results:
+                break
+    return results
+
+def fetch_results(query: str, num_results: int = 5) -> List[SearchResult]:
+    """
+    Searches DuckDuckGo and returns the parsed results.
+    Results are cached per normalized query; network errors raise requests exceptions.
+    Empty results (including blocked or rate-limited pages) are not cached.
+    """
+    key = (_normalize_query(query), num_results)
+    cached = _cached_results(key)
+    if cached is not None:
+        return cached
+
+    response = get_session().get(SEARCH_URL, params={'q': query}, timeout=REQUEST_TIMEOUT)
+    response.raise_for_status()
+
+    results = parse_results(response.text, num_results)
+    if results:
+        _store_results(key, results)
+    return results
+
+def format_results(results: List[SearchResult]) -> str:
+    lines = []
+    for i, result in enumerate(results, 1):
+        lines.append(f"{i}. {result.title}")
+        lines.append(f"   {result.snippet}")
+        lines.append(f"   Link: {result.link}\n")
+    return '\n'.join(lines) + '\n' if lines else "No results found."
 
 def search_web(query: str, num_results: int = 5) -> str:
     """
     Perform a web search using DuckDuckGo and return formatted results
     """
     try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        }
-        url = f"https://html.duckduckgo.com/html/?q={query}"
-        response = requests.get(url, headers=headers)
-        
-        if response.status_code == 200:
-            soup = BeautifulSoup(response.text, 'html.parser')
-            results = []
-            
-            for result in soup.find_all('div', class_='result')[:num_results]:
-                title = result.find('a', class_='result__a')
-                snippet = result.find('a', class_='result__snippet')
-                link = title.get('href') if title else None
-                
-                if title and snippet:
-                    results.append({
-                        'title': title.text.strip(),
-                        'snippet': snippet.text.strip(),
-                        'link': link
-                    })
-            
-            # Format results as a string
-            formatted_results = ""
-            for i, result in enumerate(results, 1):
-                formatted_results += f"{i}. {result['title']}\n"
-                formatted_results += f"   {result['snippet']}\n"
-                formatted_results += f"   Link: {result['link']}\n\n"
-            
-            return formatted_results if formatted_results else "No results found."
-            
-        else:
-            return f"Error performing web search: {response.status_code}"
-            
+        return format_results(fetch_results(query, num_results))
+    except requests.HTTPError as e:
+        return f"Error performing web search: {e.response.status_code}"
     except Exception as e:
         return f"Error during web search: {str(e)}"
+
+def split_queries(text: str) -> List[str]:
+    """Splits a multi-query prompt such as "sqlite wal; postgres mvcc" into its queries"""
+    return [query.strip() for query in text.split(';') if query.strip()]
+
+def search_many(queries: List[str], num_results: int = 5) -> List[str]:
+    """Runs several searches concurrently and returns their formatted results in query order"""
+    if not queries:
+        return []
+    with ThreadPoolExecutor(max_workers=min(MAX_PARALLEL_SEARCHES, len(queries))) as executor:
+        return list(executor.map(lambda query: search_web(query, num_results), queries))
+
+def benchmark_parse(html: str, runs: int = 50, num_results: int = 5) -> float:
+    """Returns the average time in milliseconds to parse one saved results page"""
+    start = time.perf_counter()
+    for _ in range(runs):
+        parse_results(html, num_results)
+    return (time.perf_counter() - start) * 1000 / runs
+
+if __name__ == "__main__":
+    # Usage: python web_search.py [saved_results_page.html ...]; defaults to the checked-in fixtures
+    import sys
+    for path in sys.argv[1:] or sorted(glob.glob(os.path.join(FIXTURE_DIR, "*.html"))):
+        with open(path, 'r', encoding='utf-8') as file:
+            page = file.read()
+        print(f"{path}: {benchmark_parse(page):.2f} ms per page ({HTML_PARSER}, {len(parse_results(page))} results)")